@@ -1,24 +1,34 @@
 """Simple Ollama client adapter.
-Provides `generate(model, prompt, stream=False)` which returns either a string response
-or yields text chunks when `stream=True`.
+Provides `generate(model, prompt, stream=False)` which returns a string response, and
+`iter_generate(model, prompt)` which yields text chunks as Ollama produces them.
 
 This adapter is defensive: it tries JSON fields `result`, `text`, `response` and
 falls back to streaming raw lines if the server provides chunked text.
 """
 from typing import Generator, Optional, Union
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
 from config.settings import settings
 from utils.logging import get_logger
 
 logger = get_logger("models.ollama_model")
 
+# Sesión HTTP persistente: cada generación reutiliza la conexión keep-alive con Ollama
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0))
 
-def _parse_json_response(r: requests.Response) -> Optional[str]:
+
+def _json_body(r: requests.Response):
+    # orjson sobre los bytes crudos: sin decodificar a str ni pasar por el json de stdlib
     try:
-        data = r.json()
+        return orjson.loads(r.content)
     except Exception:
         return None
+
+
+def _extract_field(data) -> Optional[str]:
     if isinstance(data, dict):
         for k in ("result", "text", "response", "content"):
             if k in data:
@@ -26,12 +36,13 @@ def _parse_json_response(r: requests.Response) -> Optional[str]:
     return None
 
 
-def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -> Union[str, Generator[str, None, None]]:
-    logger.info("ollama_generate_called", model=model, stream=stream)
-    url = settings.ollama_generate_url
-    
+def _parse_json_response(r: requests.Response) -> Optional[str]:
+    return _extract_field(_json_body(r))
+
+
+def _build_payload(model: str, prompt: str, stream: bool) -> dict:
     # Parámetros optimizados para velocidad y calidad
-    payload = {
+    return {
         "model": model,
         "prompt": prompt,
         "stream": stream,
@@ -52,9 +63,16 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
         }
     }
 
+
+def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -> Union[str, Generator[str, None, None]]:
+    logger.info("ollama_generate_called", model=model, stream=stream)
+    url = settings.ollama_generate_url
+    
+    payload = _build_payload(model, prompt, stream)
+
     if not stream:
         try:
-            r = requests.post(url, json=payload, timeout=timeout)
+            r = _SESSION.post(url, json=payload, timeout=timeout)
             
             # Handle HTTP errors immediately for Claude models
             if r.status_code != 200 and "claude" in model:
@@ -62,7 +80,7 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
                 # attempt fallback to mixtral
                 fallback_model = "mixtral:8x7b"
                 payload["model"] = fallback_model
-                rf = requests.post(url, json=payload, timeout=timeout)
+                rf = _SESSION.post(url, json=payload, timeout=timeout)
                 rf.raise_for_status()
                 parsed_f = _parse_json_response(rf)
                 if parsed_f is not None:
@@ -71,17 +89,15 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
             
             # If Ollama returns a JSON error like {"error": "model 'X' not found"} and the requested
             # model is Claude, automatically fallback to Mixtral (Sofía's policy).
-            try:
-                j = r.json()
-            except Exception:
-                j = None
+            # El cuerpo se parsea una sola vez y se reutiliza abajo
+            j = _json_body(r)
 
             if j and isinstance(j, dict) and "error" in j and "claude" in model:
                 logger.warning("claude_fallback_to_mixtral", error=j.get("error"))
                 # attempt fallback to mixtral
                 fallback_model = "mixtral:8x7b"
                 payload["model"] = fallback_model
-                rf = requests.post(url, json=payload, timeout=timeout)
+                rf = _SESSION.post(url, json=payload, timeout=timeout)
                 rf.raise_for_status()
                 parsed_f = _parse_json_response(rf)
                 if parsed_f is not None:
@@ -92,7 +108,7 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
             r.raise_for_status()
 
             # Try parse JSON-friendly responses
-            parsed = _parse_json_response(r)
+            parsed = _extract_field(j)
             if parsed is not None:
                 # If parsed is itself JSON-like string, coerce to string
                 if isinstance(parsed, (dict, list)):
@@ -102,26 +118,12 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
 
             # If the response text looks like JSON or multiple JSON objects (chunked), try to extract 'response' fields
             text = r.text or ""
-            # First try single JSON object
-            try:
-                j2 = json.loads(text)
-                parsed2 = None
-                if isinstance(j2, dict):
-                    for k in ("result", "text", "response", "content"):
-                        if k in j2:
-                            parsed2 = j2[k]
-                            break
-                if parsed2:
-                    return parsed2 if isinstance(parsed2, str) else json.dumps(parsed2, ensure_ascii=False)
-            except Exception:
-                pass
-
             # Try parsing the text as newline-separated JSON objects (common streaming format)
             lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
             extracted = []
             for ln in lines:
                 try:
-                    obj = json.loads(ln)
+                    obj = orjson.loads(ln)
                     if isinstance(obj, dict) and "response" in obj:
                         extracted.append(obj.get("response") or "")
                         continue
@@ -144,7 +146,7 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
                 fallback_model = "mixtral:8x7b"
                 payload["model"] = fallback_model
                 try:
-                    rf = requests.post(url, json=payload, timeout=timeout)
+                    rf = _SESSION.post(url, json=payload, timeout=timeout)
                     rf.raise_for_status()
                     parsed_f = _parse_json_response(rf)
                     if parsed_f is not None:
@@ -165,7 +167,7 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
         # Collect all chunks and return the assembled clean text at the end.
         parts = []
         try:
-            with requests.post(url, json=payload, stream=True, timeout=timeout) as r:
+            with _SESSION.post(url, json=payload, stream=True, timeout=timeout) as r:
                 for chunk in r.iter_lines(decode_unicode=True):
                     if chunk is None:
                         continue
@@ -177,7 +179,7 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
             combined = "\n".join(parts).strip()
             # If combined looks like JSON, try to extract useful fields
             try:
-                j = json.loads(combined)
+                j = orjson.loads(combined)
                 if isinstance(j, dict):
                     for k in ("result", "text", "response", "content"):
                         if k in j:
@@ -192,3 +194,25 @@ def generate(model: str, prompt: str, stream: bool = False, timeout: int = 10) -
 
     # For stream=True we return the fully assembled string (not a generator)
     return _stream_generator()
+
+
+def iter_generate(model: str, prompt: str, timeout=(10, 300)) -> Generator[str, None, None]:
+    """Genera con `stream: True` y entrega cada fragmento `response` en cuanto llega.
+
+    `timeout` es (conexión, lectura): el de lectura aplica entre fragmentos, no al total.
+    """
+    logger.info("ollama_iter_generate_called", model=model)
+    payload = _build_payload(model, prompt, True)
+    with _SESSION.post(settings.ollama_generate_url, json=payload, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            obj = orjson.loads(line)
+            if "error" in obj:
+                raise RuntimeError(obj["error"])
+            chunk = obj.get("response")
+            if chunk:
+                yield chunk
+            if obj.get("done"):
+                break
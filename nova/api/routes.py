@@ -1,17 +1,17 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
 from nova.api.models import ChatRequest, ChatResponse
-from nova.core import orquestador
-from nova.core.memoria import init_db, save_conversation
+from nova.core import orquestador, llm_router
+from nova.core.memoria import init_db, save_conversations, close_db
 from nova.core import feedback_system
 from nova.api.models import FeedbackRequest, MetricsResponse
 from utils.logging import get_logger
 from config.settings import settings
 from nova.api.middleware import setup_middlewares, simple_rate_limit_middleware
 from nova.core.auto_optimizer import auto_optimize, get_current_priorities, get_optimization_history
-from fastapi.concurrency import run_in_threadpool
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
 import threading
 import time
 import os
@@ -19,6 +19,7 @@ from pathlib import Path
 import base64
 import secrets
 import requests
+from requests.adapters import HTTPAdapter
 # from nova.core.cache_system import cache_system  # Commented out to avoid DB issues
 
 # CORS
@@ -26,6 +27,10 @@ from fastapi.middleware.cors import CORSMiddleware
 
 logger = get_logger("api.routes")
 
+# Sesión HTTP persistente para las llamadas de visión a Ollama (reutiliza la conexión keep-alive)
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0))
+
 # Auto-tuning service global
 auto_tuning_thread = None
 auto_tuning_active = False
@@ -38,6 +43,8 @@ async def lifespan(app: FastAPI):
     logger.info("app_startup")
     yield
     # Shutdown
+    await llm_router.aclose()
+    close_db()
     logger.info("app_shutdown")
 
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
@@ -82,7 +89,7 @@ async def _analyze_image_base64(image_b64: str, prompt: str = "Analiza esta imag
             "images": [image_b64],
             "stream": False
         }
-        r = requests.post(settings.ollama_generate_url, json=payload, timeout=timeout)
+        r = _SESSION.post(settings.ollama_generate_url, json=payload, timeout=timeout)
         r.raise_for_status()
         data = r.json()
         # Extraer solo el texto de respuesta
@@ -131,9 +138,17 @@ async def root():
     return RedirectResponse(url="/webui/index.html", status_code=302)
 
 
+def _persist_turn(rows: list) -> None:
+    """Guardar un turno (usuario + asistente) en una sola transacción, tras enviar la respuesta."""
+    try:
+        save_conversations(rows)
+    except Exception as e:
+        logger.error("persist_turn_failed", error=str(e), count=len(rows))
+
+
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
-    routing = await run_in_threadpool(orquestador.route_query, request.message, request.has_image)
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
+    routing = await orquestador.route_query_async(request.message, request.has_image)
     # If router asks for clarification, return the clarifying shape and DO NOT generate a model response
     if routing.get("status") == "needs_clarification":
         return {"status": "clarify", "message": routing.get("message")}
@@ -148,13 +163,66 @@ async def chat(request: ChatRequest):
     session_id = request.session_id or "default"
     # ensure DB initialized (safety for test environments)
     await run_in_threadpool(init_db)
-    user_msg_id = await run_in_threadpool(save_conversation, session_id, "user", request.message, routing["model"], routing.get("reasoning"), routing.get("confidence"))
-    assistant_msg_id = await run_in_threadpool(save_conversation, session_id, "assistant", response, routing["model"], routing.get("reasoning"), routing.get("confidence"))
+    # La escritura (y su commit) corre después de enviar la respuesta
+    background_tasks.add_task(_persist_turn, [
+        (session_id, "user", request.message, routing["model"], routing.get("reasoning"), routing.get("confidence")),
+        (session_id, "assistant", response, routing["model"], routing.get("reasoning"), routing.get("confidence")),
+    ])
 
     logger.info("chat_handled", session_id=session_id, model=routing["model"]) 
     return {"response": response, "model_used": routing["model"], "router_confidence": routing["confidence"]}
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks):
+    """Igual que /api/chat, pero el texto se envía en fragmentos a medida que el modelo lo genera."""
+    routing = await orquestador.route_query_async(request.message, request.has_image)
+    if routing.get("status") == "needs_clarification":
+        return {"status": "clarify", "message": routing.get("message")}
+
+    session_id = request.session_id or "default"
+    await run_in_threadpool(init_db)
+    parts = []
+    completed = False
+
+    def _chunks():
+        nonlocal completed
+        stream = orquestador.stream_response(routing["model"], request.message)
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            # Cierra la conexión con Ollama también cuando el cliente se desconecta a mitad
+            stream.close()
+
+    async def _body():
+        chunks = _chunks()
+        try:
+            # El generador es síncrono (requests): cada fragmento se pide en el threadpool
+            async for chunk in iterate_in_threadpool(chunks):
+                yield chunk
+        finally:
+            # Starlette no cierra el iterador al cancelar el stream; sin esto queda suspendido hasta el GC
+            chunks.close()
+
+    def _persist_streamed_turn():
+        # Starlette también corre la tarea si el cliente se desconectó: no guardar respuestas cortadas
+        if not completed:
+            logger.warning("chat_stream_incomplete", session_id=session_id, model=routing["model"], chunks=len(parts))
+            return
+        _persist_turn([
+            (session_id, "user", request.message, routing["model"], routing.get("reasoning"), routing.get("confidence")),
+            (session_id, "assistant", "".join(parts), routing["model"], routing.get("reasoning"), routing.get("confidence")),
+        ])
+        logger.info("chat_stream_handled", session_id=session_id, model=routing["model"])
+
+    background_tasks.add_task(_persist_streamed_turn)
+    return StreamingResponse(_body(), media_type="text/plain; charset=utf-8",
+                             headers={"X-Model-Used": routing["model"]})
+
+
 @app.post("/api/tts")
 async def text_to_speech(text: str):
     """Convertir texto a voz usando Web Speech API del navegador (placeholder para futura integración)"""
@@ -176,7 +244,7 @@ async def text_to_speech(text: str):
 
 
 @app.post("/api/upload")
-async def upload_image(file: UploadFile = File(...), message: str = Form("Describe esta imagen"), session_id: str = Form(None)):
+async def upload_image(background_tasks: BackgroundTasks, file: UploadFile = File(...), message: str = Form("Describe esta imagen"), session_id: str = Form(None)):
     """Subir imagen y procesar con LLaVA end-to-end para análisis inteligente."""
     try:
         session_id = session_id or f"upload_{secrets.token_hex(8)}"
@@ -223,8 +291,10 @@ async def upload_image(file: UploadFile = File(...), message: str = Form("Descri
         # Persistir en DB
         await run_in_threadpool(init_db)
         safe_filename = Path(file.filename or "imagen").name
-        await run_in_threadpool(save_conversation, session_id, "user", f"[Imagen subida: {safe_filename}] Instrucción: {message}", model_used, "vision_processing", 100)
-        await run_in_threadpool(save_conversation, session_id, "assistant", response, model_used, "vision_response", 100)
+        background_tasks.add_task(_persist_turn, [
+            (session_id, "user", f"[Imagen subida: {safe_filename}] Instrucción: {message}", model_used, "vision_processing", 100),
+            (session_id, "assistant", response, model_used, "vision_response", 100),
+        ])
 
         await file.close()
 
@@ -250,6 +320,14 @@ async def feedback(req: FeedbackRequest):
     return {"status": "ok", "feedback_id": fid}
 
 
+@app.get("/api/feedback/performance")
+async def feedback_performance(days: int = 7):
+    """Análisis de rendimiento por modelo, serializado directamente a JSON."""
+    await run_in_threadpool(init_db)
+    body = await run_in_threadpool(feedback_system.analyze_performance_json, days)
+    return Response(content=body, media_type="application/json")
+
+
 @app.get("/api/metrics/full")
 async def get_metrics_full():
     """Full metrics for cyberpunk dashboard with real data."""
@@ -323,6 +401,14 @@ async def get_metrics():
     }
 
 
+# Fila de modelo del dashboard HTML
+_MODEL_METRIC_HTML = """
+                <div class="metric">
+                    <span>{model}</span>
+                    <span class="metric-value">{priority}</span>
+                </div>"""
+
+
 @app.get("/api/dashboard")
 async def dashboard():
     """Dashboard HTML definitivo de NOVA con métricas completas y auto-refresh"""
@@ -333,12 +419,12 @@ async def dashboard():
             from nova.core import memoria
             with memoria._get_conn() as conn:
                 c = conn.cursor()
-                c.execute("SELECT COUNT(*) FROM messages")
-                total_messages = c.fetchone()[0]
-                c.execute("SELECT COUNT(*) FROM feedback")
-                total_feedback = c.fetchone()[0]
-                c.execute("SELECT COUNT(*) FROM response_cache")
-                total_cache_entries = c.fetchone()[0]
+                c.execute(
+                    "SELECT (SELECT COUNT(*) FROM messages), "
+                    "(SELECT COUNT(*) FROM feedback), "
+                    "(SELECT COUNT(*) FROM response_cache)"
+                )
+                total_messages, total_feedback, total_cache_entries = c.fetchone()
             return total_messages, total_feedback, total_cache_entries
 
         total_messages, total_feedback, total_cache_entries = await run_in_threadpool(_collect_basic_metrics)
@@ -465,13 +551,10 @@ async def dashboard():
 </html>"""
 
         # Generar HTML para modelos
-        models_html = ""
-        for model, priority in auto_tuning_status['current_priorities'].items():
-            models_html += f"""
-                <div class="metric">
-                    <span>{model}</span>
-                    <span class="metric-value">{priority}</span>
-                </div>"""
+        models_html = "".join([
+            _MODEL_METRIC_HTML.format(model=model, priority=priority)
+            for model, priority in auto_tuning_status['current_priorities'].items()
+        ])
 
         # Formatear el HTML
         html_content = html_template.format(
@@ -515,9 +598,11 @@ def auto_tuning_worker(interval_minutes=30):
             auto_tuning_stats["last_run"] = time.time()
 
             if result["status"] == "optimized":
-                logger.info(f"✅ Auto-tuning: {len(result['changes_applied'])} cambios aplicados")
-                for change in result["changes_applied"]:
-                    logger.info(f"   {change['model']}: {change['old_priority']} → {change['new_priority']}")
+                changes = result["changes_applied"]
+                logger.info(
+                    f"✅ Auto-tuning: {len(changes)} cambios aplicados",
+                    changes={c["model"]: f"{c['old_priority']} → {c['new_priority']}" for c in changes}
+                )
             else:
                 logger.debug(f"📭 Auto-tuning: {result['status']}")
 
@@ -575,14 +660,7 @@ async def stop_auto_tuning():
 @app.get("/api/auto-tuning/status")
 async def get_auto_tuning_status():
     """Obtener estado del auto-tuning"""
-    global auto_tuning_stats
-
-    return {
-        "active": auto_tuning_active,
-        "stats": auto_tuning_stats,
-        "current_priorities": get_current_priorities(),
-        "recent_history": get_optimization_history(limit=5)
-    }
+    return get_auto_tuning_status_sync()
 
 
 def get_auto_tuning_status_sync():
@@ -5,8 +5,10 @@ Sistema de auto-optimización automática que ajusta prioridades de modelos basa
 import json
 import os
 import shutil
+import sqlite3
 from datetime import datetime
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
 from nova.core.feedback_system import analyze_performance
@@ -41,10 +43,10 @@ def _init_optimization_log() -> None:
         c.execute("CREATE INDEX IF NOT EXISTS idx_optimization_created ON optimization_log(created_at)")
 
 
-def _load_model_profiles() -> Dict[str, Any]:
-    """Cargar perfiles de modelos desde el archivo JSON."""
+def _load_model_profiles(path: Optional[str] = None) -> Dict[str, Any]:
+    """Cargar perfiles de modelos desde el archivo JSON (por defecto settings.model_profiles_path)."""
     try:
-        with open(settings.model_profiles_path, 'r', encoding='utf-8') as f:
+        with open(path or settings.model_profiles_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
         logger.error("load_model_profiles_failed", error=str(e))
@@ -56,6 +58,8 @@ def _save_model_profiles(profiles: Dict[str, Any]) -> None:
     try:
         with open(settings.model_profiles_path, 'w', encoding='utf-8') as f:
             json.dump(profiles, f, indent=2, ensure_ascii=False)
+        # La clave (mtime, tamaño) puede repetirse si el cambio conserva el tamaño en el mismo tick
+        _priorities_for.cache_clear()
         logger.info("model_profiles_saved", path=settings.model_profiles_path)
     except Exception as e:
         logger.error("save_model_profiles_failed", error=str(e))
@@ -180,18 +184,13 @@ def auto_optimize(max_change: int = 20, min_feedback: int = 5) -> Dict[str, Any]
                     "reason": reason
                 })
 
-                logger.info("priority_adjusted",
-                          model=model_name,
-                          old=old_priority,
-                          new=new_priority,
-                          change=change_amount,
-                          rating=stats["avg_rating"])
-
         # Guardar cambios si hay actualizaciones
         if changes_applied:
             _save_model_profiles(model_profiles)
+            # Un solo evento con todos los ajustes en lugar de uno por modelo
             logger.info("auto_optimize_completed",
                       changes=len(changes_applied),
+                      adjusted={c["model"]: (c["old_priority"], c["new_priority"]) for c in changes_applied},
                       total_feedback=total_feedback,
                       backup=backup_path)
 
@@ -224,6 +223,8 @@ def get_optimization_history(limit: int = 50) -> List[Dict[str, Any]]:
     """Obtener historial de optimizaciones."""
     with _get_conn() as conn:
         c = conn.cursor()
+        # Las columnas ya tienen los nombres de las claves del dict
+        c.row_factory = sqlite3.Row
         c.execute(
             """
             SELECT model_name, old_priority, new_priority, change_amount, reason,
@@ -235,27 +236,26 @@ def get_optimization_history(limit: int = 50) -> List[Dict[str, Any]]:
             (limit,)
         )
 
-        history = []
-        for row in c.fetchall():
-            history.append({
-                "model_name": row[0],
-                "old_priority": row[1],
-                "new_priority": row[2],
-                "change_amount": row[3],
-                "reason": row[4],
-                "avg_rating": row[5],
-                "total_feedback": row[6],
-                "created_at": row[7]
-            })
+        return [dict(row) for row in c.fetchall()]
+
 
-        return history
+@lru_cache(maxsize=8)
+def _priorities_for(path: str, mtime_ns: int, size: int) -> Tuple[Tuple[str, int], ...]:
+    """Prioridades de un archivo de perfiles; la versión (mtime, tamaño) forma parte de la clave.
+
+    Un error de lectura se propaga (lru_cache no memoriza excepciones): un archivo a medio
+    escribir no deja un resultado vacío cacheado bajo esa clave.
+    """
+    profiles = _load_model_profiles(path)
+    return tuple((model, data["priority"]) for model, data in profiles.items())
 
 
 def get_current_priorities() -> Dict[str, int]:
     """Obtener prioridades actuales de todos los modelos."""
     try:
-        profiles = _load_model_profiles()
-        return {model: data["priority"] for model, data in profiles.items()}
+        path = settings.model_profiles_path
+        st = os.stat(path)
+        return dict(_priorities_for(path, st.st_mtime_ns, st.st_size))
     except Exception as e:
         logger.error("get_current_priorities_failed", error=str(e))
         return {}
\ No newline at end of file
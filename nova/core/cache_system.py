@@ -11,17 +11,68 @@ from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 import os
 import threading
+from collections import OrderedDict
 
 from nova.core.memoria import _get_conn
 from config.settings import settings
 
 
+# Parámetros de generación que forman parte de la clave de caché
+_KEY_PARAMS = frozenset(("temperature", "max_tokens", "top_p"))
+# Codificador de strings de json (C, ensure_ascii=True): el mismo que usa json.dumps por defecto
+_json_str = json.encoder.encode_basestring_ascii
+
+# Entradas de respuesta mantenidas en memoria delante de SQLite (LRU)
+_MEM_CACHE_SIZE = 2048
+# Hits acumulados en memoria antes de volcarlos a response_cache en un solo executemany
+_HIT_FLUSH_THRESHOLD = 64
+
+
 class CacheSystem:
     """Sistema de caché inteligente para respuestas de modelos"""
 
     def __init__(self, ttl_days: int = 7):
         self.ttl_seconds = ttl_days * 24 * 60 * 60
+        # cache_key -> [response_json, metadata_json, created_at, expires_at, hit_count, model_name]
+        self._mem: "OrderedDict[str, list]" = OrderedDict()
+        self._mem_path: Optional[str] = None
+        # cache_key -> (hits pendientes, último acceso)
+        self._pending_hits: Dict[str, tuple] = {}
+        self._mem_lock = threading.Lock()
         self._init_cache_table()
+        # Barrido inicial de entradas expiradas (las lecturas ya las ignoran por expires_at)
+        self.purge_expired()
+
+    def _check_mem_path(self) -> None:
+        """Vaciar la caché en memoria si cambió la base de datos (llamar con _mem_lock)"""
+        if self._mem_path != settings.db_path:
+            self._mem.clear()
+            self._pending_hits.clear()
+            self._mem_path = settings.db_path
+
+    def _remember(self, cache_key: str, entry: list) -> None:
+        """Insertar/actualizar una entrada en el LRU en memoria (llamar con _mem_lock)"""
+        self._mem[cache_key] = entry
+        self._mem.move_to_end(cache_key)
+        if len(self._mem) > _MEM_CACHE_SIZE:
+            self._mem.popitem(last=False)
+
+    def _flush_hits(self, conn) -> None:
+        """Volcar los hits acumulados en memoria a response_cache"""
+        with self._mem_lock:
+            if not self._pending_hits:
+                return
+            pending = self._pending_hits
+            self._pending_hits = {}
+        conn.executemany(
+            "UPDATE response_cache SET hit_count = hit_count + ?, last_accessed = ? WHERE cache_key = ?",
+            [(hits, last, key) for key, (hits, last) in pending.items()],
+        )
+
+    def flush_hits(self) -> None:
+        """Persistir los hit counts pendientes (p.ej. antes de apagar)"""
+        with _get_conn() as conn:
+            self._flush_hits(conn)
 
     def _init_cache_table(self):
         """Inicializar tabla de caché si no existe"""
@@ -37,7 +88,7 @@ class CacheSystem:
                     expires_at TIMESTAMP,
                     hit_count INTEGER DEFAULT 0,
                     last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                ) WITHOUT ROWID
             """)
 
             # Índices para performance
@@ -49,24 +100,27 @@ class CacheSystem:
                 CREATE INDEX IF NOT EXISTS idx_response_cache_model
                 ON response_cache(model_name)
             """)
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_response_cache_query_model
-                ON response_cache(query, model_name)
-            """)
+            # Las lecturas van por cache_key; un índice sobre (query, model_name) solo encarece los INSERT
+            conn.execute("DROP INDEX IF EXISTS idx_response_cache_query_model")
 
             conn.commit()
 
     def _generate_cache_key(self, query: str, model_name: str, **kwargs) -> str:
         """Generar clave única para el caché"""
         # Incluir parámetros relevantes en el hash
-        cache_data = {
-            "query": query.strip().lower(),
-            "model": model_name,
-            "params": {k: v for k, v in kwargs.items() if k in ["temperature", "max_tokens", "top_p"]}
-        }
-
-        # Crear hash consistente
-        cache_string = json.dumps(cache_data, sort_keys=True)
+        params = {k: v for k, v in kwargs.items() if k in _KEY_PARAMS}
+        query = query.strip().lower()
+
+        # Crear hash consistente. Mismo texto que json.dumps(cache_data, sort_keys=True)
+        # (las claves existentes siguen valiendo), sin serializar el dict completo en cada llamada.
+        if isinstance(model_name, str):
+            cache_string = '{"model": %s, "params": %s, "query": %s}' % (
+                _json_str(model_name),
+                json.dumps(params, sort_keys=True) if params else "{}",
+                _json_str(query),
+            )
+        else:
+            cache_string = json.dumps({"query": query, "model": model_name, "params": params}, sort_keys=True)
         return hashlib.sha256(cache_string.encode()).hexdigest()
 
     def get_cached_response(self, query: str, model_name: str, **kwargs) -> Optional[Dict[str, Any]]:
@@ -79,9 +133,40 @@ class CacheSystem:
         cache_key = self._generate_cache_key(query, model_name, **kwargs)
         current_time = time.time()
 
+        # Primer nivel: LRU en memoria, sin tocar SQLite
+        with self._mem_lock:
+            self._check_mem_path()
+            entry = self._mem.get(cache_key)
+            if entry is not None:
+                if entry[3] is not None and entry[3] > current_time:
+                    self._mem.move_to_end(cache_key)
+                    entry[4] += 1
+                    hits, _ = self._pending_hits.get(cache_key, (0, 0))
+                    self._pending_hits[cache_key] = (hits + 1, current_time)
+                    flush = len(self._pending_hits) >= _HIT_FLUSH_THRESHOLD
+                    response_json, metadata_json, created_at, _, hit_count, _ = entry
+                else:
+                    # Expirada: se descarta y se consulta SQLite como antes
+                    del self._mem[cache_key]
+                    entry = None
+        if entry is not None:
+            if flush:
+                with _get_conn() as conn:
+                    self._flush_hits(conn)
+            return {
+                "response": json.loads(response_json),
+                "cached": True,
+                "cache_key": cache_key,
+                "created_at": created_at,
+                "hit_count": hit_count,
+                "latency": 0,  # Cache hit = ~0ms
+                "metadata": json.loads(metadata_json) if metadata_json else {}
+            }
+
         with _get_conn() as conn:
+            self._flush_hits(conn)
             cursor = conn.execute("""
-                SELECT response, created_at, hit_count, metadata
+                SELECT response, created_at, hit_count, metadata, expires_at
                 FROM response_cache
                 WHERE cache_key = ? AND expires_at > ?
             """, (cache_key, current_time))
@@ -89,7 +174,7 @@ class CacheSystem:
             row = cursor.fetchone()
 
             if row:
-                response_json, created_at, hit_count, metadata_json = row
+                response_json, created_at, hit_count, metadata_json, expires_at = row
 
                 # Actualizar hit_count y last_accessed
                 new_hit_count = hit_count + 1
@@ -104,22 +189,28 @@ class CacheSystem:
                 try:
                     response_data = json.loads(response_json)
                     metadata = json.loads(metadata_json) if metadata_json else {}
-
-                    return {
-                        "response": response_data,
-                        "cached": True,
-                        "cache_key": cache_key,
-                        "created_at": created_at,
-                        "hit_count": new_hit_count,
-                        "latency": 0,  # Cache hit = ~0ms
-                        "metadata": metadata
-                    }
                 except json.JSONDecodeError:
                     # Si hay error en el JSON, eliminar entrada corrupta
                     conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
                     conn.commit()
                     return None
 
+                with self._mem_lock:
+                    self._remember(
+                        cache_key,
+                        [response_json, metadata_json, created_at, expires_at, new_hit_count, model_name],
+                    )
+
+                return {
+                    "response": response_data,
+                    "cached": True,
+                    "cache_key": cache_key,
+                    "created_at": created_at,
+                    "hit_count": new_hit_count,
+                    "latency": 0,  # Cache hit = ~0ms
+                    "metadata": metadata
+                }
+
         return None
 
     def save_to_cache(self, query: str, model_name: str, response: Any,
@@ -164,10 +255,45 @@ class CacheSystem:
                 expires_at,
                 0  # hit_count inicia en 0
             ))
+            # created_at lo fija el DEFAULT de la tabla; SELECT por clave primaria en lugar de
+            # RETURNING, que requiere SQLite 3.35+
+            created_at = conn.execute(
+                "SELECT created_at FROM response_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()[0]
             conn.commit()
 
+            # Write-through: la siguiente lectura se sirve desde memoria
+            with self._mem_lock:
+                self._check_mem_path()
+                self._pending_hits.pop(cache_key, None)
+                self._remember(
+                    cache_key,
+                    [response_json, metadata_json, created_at, expires_at, 0, model_name],
+                )
+
         return cache_key
 
+    def purge_expired(self) -> int:
+        """
+        Eliminar las entradas expiradas (recorre idx_response_cache_expires_at)
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        current_time = time.time()
+        with self._mem_lock:
+            self._check_mem_path()
+            for key in [k for k, e in self._mem.items() if e[3] is None or e[3] <= current_time]:
+                del self._mem[key]
+
+        with _get_conn() as conn:
+            self._flush_hits(conn)
+            cursor = conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (current_time,))
+            deleted_count = cursor.rowcount
+            conn.commit()
+
+        return deleted_count
+
     def invalidate_cache(self, pattern: Optional[str] = None, model_name: Optional[str] = None) -> int:
         """
         Invalidar entradas del caché
@@ -179,7 +305,16 @@ class CacheSystem:
         Returns:
             Número de entradas invalidadas
         """
+        with self._mem_lock:
+            self._check_mem_path()
+            if model_name:
+                for key in [k for k, e in self._mem.items() if e[5] == model_name]:
+                    del self._mem[key]
+            else:
+                self._mem.clear()
+
         with _get_conn() as conn:
+            self._flush_hits(conn)
             if model_name:
                 # Invalidar por modelo
                 cursor = conn.execute("DELETE FROM response_cache WHERE model_name = ?", (model_name,))
@@ -200,6 +335,8 @@ class CacheSystem:
         current_time = time.time()
 
         with _get_conn() as conn:
+            self._flush_hits(conn)
+
             # Total de entradas
             cursor = conn.execute("SELECT COUNT(*) FROM response_cache")
             total_entries = cursor.fetchone()[0]
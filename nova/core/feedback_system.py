@@ -2,14 +2,151 @@
 Feedback System - Sprint 3
 Sistema de retroalimentación humana para que NOVA aprenda y mejore automáticamente.
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from collections import defaultdict
+from operator import itemgetter
 from datetime import datetime, timedelta
+import calendar
+import re
 import sqlite3
+import threading
+import time
+import orjson
 from nova.core.memoria import _get_conn
+from config.settings import settings
 from utils.logging import get_logger
 
 logger = get_logger("core.feedback_system")
 
+# Comentarios que mencionan problemas específicos
+_ERROR_PATTERNS = {
+    "wrong_model": ["equivocado", "mal modelo", "tocaba", "debía ser", "wrong model"],
+    "too_slow": ["lento", "slow", "demasiado tiempo", "esperar"],
+    "poor_quality": ["malo", "pobre", "inútil", "basura", "terrible"],
+    "incomplete": ["incompleto", "falta", "inacabado", "corto"],
+    "off_topic": ["tema", "irrelevante", "off topic", "no responde"]
+}
+
+# Una alternación compilada por tipo de error (equivale a los LIKE '%kw%' unidos con OR)
+_ERROR_RE = {
+    error_type: re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+    for error_type, keywords in _ERROR_PATTERNS.items()
+}
+
+
+# Consultas SQL reutilizadas (texto constante: aprovechan la caché de sentencias de sqlite3)
+# Inserta tomando model_used del mensaje; si el message_id no existe no inserta ninguna fila
+_SQL_INSERT_FEEDBACK_FROM_MESSAGE = """
+    INSERT INTO feedback (message_id, session_id, rating, comment, model_used, created_at, created_at_ts)
+    SELECT id, ?, ?, ?, model_used, ?, ? FROM messages WHERE id = ?
+"""
+_SQL_SELECT_FEEDBACK_MODEL = "SELECT model_used FROM feedback WHERE id = ?"
+_SQL_SELECT_MESSAGE_MODELS = "SELECT id, model_used FROM messages WHERE id IN ({})"
+_SQL_INSERT_FEEDBACK = """
+    INSERT INTO feedback (message_id, session_id, rating, comment, model_used, created_at, created_at_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# AS MATERIALIZED (SQLite 3.35+) fija que la CTE se evalúe una sola vez; en versiones
+# anteriores se omite y la consulta da el mismo resultado
+_CTE_MATERIALIZED = "MATERIALIZED " if sqlite3.sqlite_version_info >= (3, 35, 0) else ""
+
+# Estadísticas por modelo y tendencias diarias en una sola consulta:
+# la CTE filtra la ventana una vez y ambas agregaciones la reutilizan.
+# Redondeos y porcentajes se calculan en SQLite; avg_raw solo fija el orden.
+_SQL_PERFORMANCE = """
+    WITH f AS {materialized}(
+        SELECT model_used, rating, DATE(created_at_ts, 'unixepoch') AS d
+        FROM feedback
+        WHERE created_at_ts >= ?
+    )
+    SELECT
+        'agg' AS kind,
+        model_used,
+        NULL AS d,
+        COUNT(*) as total_feedback,
+        ROUND(AVG(rating), 2) as avg_rating,
+        MIN(rating) as min_rating,
+        MAX(rating) as max_rating,
+        SUM(CASE WHEN rating >= 4 THEN 1 ELSE 0 END) as good_ratings,
+        SUM(CASE WHEN rating <= 2 THEN 1 ELSE 0 END) as bad_ratings,
+        ROUND(100.0 * SUM(CASE WHEN rating >= 4 THEN 1 ELSE 0 END) / COUNT(*), 1) as good_percentage,
+        ROUND(100.0 * SUM(CASE WHEN rating <= 2 THEN 1 ELSE 0 END) / COUNT(*), 1) as bad_percentage,
+        AVG(rating) as avg_raw
+    FROM f
+    GROUP BY model_used
+    UNION ALL
+    SELECT 'daily', model_used, d, COUNT(*), ROUND(AVG(rating), 2), NULL, NULL, NULL, NULL, NULL, NULL, AVG(rating)
+    FROM f
+    GROUP BY d, model_used
+    ORDER BY kind, d DESC, avg_raw DESC, model_used
+""".format(materialized=_CTE_MATERIALIZED)
+
+# Un solo recorrido de los comentarios negativos; la clasificación se hace en memoria
+_SQL_ERROR_COMMENTS = """
+    SELECT f.model_used, f.comment
+    FROM feedback f
+    WHERE f.created_at_ts >= ?
+      AND f.rating <= 3
+      AND f.comment IS NOT NULL
+    ORDER BY f.model_used
+"""
+
+# El mensaje original se trunca en SQLite: solo viajan los primeros 100 caracteres
+_SQL_RECENT_FEEDBACK = """
+    SELECT f.id, f.message_id, f.session_id, f.rating, f.comment, f.model_used, f.created_at,
+           SUBSTR(m.message, 1, 100) as msg_head, LENGTH(m.message) as msg_len
+    FROM feedback f
+    JOIN messages m ON f.message_id = m.id
+    ORDER BY f.created_at DESC
+    LIMIT ?
+"""
+
+
+def _to_ts(dt: datetime) -> int:
+    """Segundos enteros de un datetime naive, con la misma convención que created_at_ts."""
+    return calendar.timegm(dt.timetuple())
+
+
+# Ruta de la base de datos cuyos índices de feedback ya se verificaron
+_indexed_db_path: Optional[str] = None
+
+
+# Caché de analyze_performance por (db_path, days): (instante, data_version, resultado).
+# Se invalida al registrar feedback; PRAGMA data_version detecta escrituras de otros procesos.
+_PERF_CACHE_TTL = 30.0
+_PERF_CACHE_SLOTS = 16
+_perf_cache: Dict[Tuple[str, int], Tuple[float, int, Dict[str, Any]]] = {}
+_perf_cache_lock = threading.Lock()
+
+
+def _invalidate_perf_cache() -> None:
+    with _perf_cache_lock:
+        _perf_cache.clear()
+
+
+def _ensure_indexes() -> None:
+    """Crear (una vez por base de datos) los índices que usan los análisis de feedback."""
+    global _indexed_db_path
+    if _indexed_db_path == settings.db_path:
+        return
+    with _get_conn() as conn:
+        c = conn.cursor()
+        # Las ventanas de tiempo filtran por created_at_ts; idx_feedback_created (de init_db)
+        # se mantiene porque sirve el ORDER BY created_at de get_recent_feedback.
+
+        # Cubre el filtro por ventana de tiempo y las agregaciones por modelo sin tocar la tabla
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_feedback_ts_model_rating "
+            "ON feedback(created_at_ts, model_used, rating)"
+        )
+        # Índice parcial para el análisis de patrones de error (solo feedback negativo)
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_feedback_bad_ts "
+            "ON feedback(created_at_ts) WHERE rating <= 3"
+        )
+    _indexed_db_path = settings.db_path
+
 
 def record_feedback(message_id: int, session_id: str, rating: int, comment: str = "") -> int:
     """
@@ -24,187 +161,225 @@ def record_feedback(message_id: int, session_id: str, rating: int, comment: str
     Returns:
         feedback_id: ID del feedback registrado
     """
+    _ensure_indexes()
+
     with _get_conn() as conn:
         c = conn.cursor()
 
-        # Verificar que el message_id existe
-        c.execute("SELECT id, model_used FROM messages WHERE id = ?", (message_id,))
-        message = c.fetchone()
-        if not message:
+        # Insertar feedback y verificar que el message_id existe en la misma sentencia
+        now = datetime.now()
+        c.execute(_SQL_INSERT_FEEDBACK_FROM_MESSAGE, (session_id, rating, comment, now, _to_ts(now), message_id))
+        if c.rowcount == 0:
             raise ValueError(f"Message ID {message_id} no encontrado")
 
-        model_used = message[1]
-
-        # Insertar feedback
-        c.execute("""
-            INSERT INTO feedback (message_id, session_id, rating, comment, model_used, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (message_id, session_id, rating, comment, model_used, datetime.now()))
-
+        # lastrowid + SELECT por clave primaria (RETURNING requiere SQLite 3.35+)
         feedback_id = c.lastrowid
+        model_used = c.execute(_SQL_SELECT_FEEDBACK_MODEL, (feedback_id,)).fetchone()[0]
         conn.commit()
+        _invalidate_perf_cache()
 
         logger.info("feedback_recorded", feedback_id=feedback_id, rating=rating, model=model_used)
         return feedback_id
 
 
+def record_feedback_bulk(items: List[Tuple[int, str, int, str]]) -> List[int]:
+    """
+    Registra varios feedbacks en una sola transacción (un único commit).
+
+    Args:
+        items: Lista de tuplas (message_id, session_id, rating, comment)
+
+    Returns:
+        Lista de feedback_ids en el mismo orden que items
+    """
+    if not items:
+        return []
+
+    _ensure_indexes()
+
+    with _get_conn() as conn:
+        c = conn.cursor()
+
+        # Resolver todos los message_id de una vez
+        message_ids = sorted({item[0] for item in items})
+        placeholders = ",".join("?" * len(message_ids))
+        c.execute(_SQL_SELECT_MESSAGE_MODELS.format(placeholders), message_ids)
+        models = dict(c.fetchall())
+
+        missing = [mid for mid in message_ids if mid not in models]
+        if missing:
+            raise ValueError(f"Message ID {missing[0]} no encontrado")
+
+        now = datetime.now()
+        now_ts = _to_ts(now)
+        rows = [
+            (message_id, session_id, rating, comment, models[message_id], now, now_ts)
+            for message_id, session_id, rating, comment in items
+        ]
+        c.executemany(_SQL_INSERT_FEEDBACK, rows)
+
+        # Un solo escritor bajo el lock de la conexión: los ids del lote son consecutivos
+        c.execute("SELECT last_insert_rowid()")
+        last_id = c.fetchone()[0]
+        conn.commit()
+        _invalidate_perf_cache()
+
+    feedback_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    logger.info("feedback_bulk_recorded", count=len(feedback_ids))
+    return feedback_ids
+
+
 def analyze_performance(days: int = 7) -> Dict[str, Any]:
     """
     Analiza el rendimiento de los modelos basado en feedback humano.
 
+    El resultado se cachea hasta _PERF_CACHE_TTL segundos y se comparte entre
+    llamadas: no debe modificarse.
+
     Args:
         days: Número de días hacia atrás para analizar
 
     Returns:
         Dict con métricas por modelo y sugerencias de mejora
     """
-    cutoff_date = datetime.now() - timedelta(days=days)
+    _ensure_indexes()
+    key = (settings.db_path, days)
 
     with _get_conn() as conn:
-        c = conn.cursor()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with _perf_cache_lock:
+            cached = _perf_cache.get(key)
+        if cached and cached[1] == data_version and time.monotonic() - cached[0] < _PERF_CACHE_TTL:
+            return cached[2]
 
-        # Obtener estadísticas por modelo
-        c.execute("""
-            SELECT
-                model_used,
-                COUNT(*) as total_feedback,
-                AVG(rating) as avg_rating,
-                MIN(rating) as min_rating,
-                MAX(rating) as max_rating,
-                SUM(CASE WHEN rating >= 4 THEN 1 ELSE 0 END) as good_ratings,
-                SUM(CASE WHEN rating <= 2 THEN 1 ELSE 0 END) as bad_ratings
-            FROM feedback
-            WHERE created_at >= ?
-            GROUP BY model_used
-            ORDER BY avg_rating DESC
-        """, (cutoff_date,))
-
-        model_stats = {}
-        for row in c.fetchall():
-            model, total, avg, min_r, max_r, good, bad = row
+        result = _compute_performance(conn, days)
+
+    with _perf_cache_lock:
+        if key not in _perf_cache and len(_perf_cache) >= _PERF_CACHE_SLOTS:
+            _perf_cache.pop(next(iter(_perf_cache)))
+        _perf_cache[key] = (time.monotonic(), data_version, result)
+    return result
+
+
+def _compute_performance(conn: sqlite3.Connection, days: int) -> Dict[str, Any]:
+    """Calcula el análisis de rendimiento sin pasar por la caché."""
+    cutoff_ts = _to_ts(datetime.now() - timedelta(days=days))
+
+    c = conn.cursor()
+
+    c.execute(_SQL_PERFORMANCE, (cutoff_ts,))
+
+    model_stats = {}
+    trends = defaultdict(list)
+    # Resumen acumulado en el mismo recorrido (mejor/peor: el primero en caso de empate)
+    total_fb = 0
+    best_model = worst_model = None
+    best_avg = worst_avg = 0
+    # Recorrer el cursor directamente: las filas se procesan a medida que llegan
+    for kind, model, date, total, avg_rating, min_r, max_r, good, bad, good_pct, bad_pct, _ in c:
+        if kind == "agg":
+            total_fb += total
+            if best_model is None or avg_rating > best_avg:
+                best_model, best_avg = model, avg_rating
+            if worst_model is None or avg_rating < worst_avg:
+                worst_model, worst_avg = model, avg_rating
             model_stats[model] = {
                 "total_feedback": total,
-                "avg_rating": round(avg, 2) if avg else 0,
+                "avg_rating": avg_rating,
                 "min_rating": min_r,
                 "max_rating": max_r,
                 "good_ratings": good,
                 "bad_ratings": bad,
-                "good_percentage": round((good / total) * 100, 1) if total > 0 else 0,
-                "bad_percentage": round((bad / total) * 100, 1) if total > 0 else 0
+                "good_percentage": good_pct,
+                "bad_percentage": bad_pct
             }
-
-        # Análisis de tendencias temporales
-        c.execute("""
-            SELECT
-                DATE(created_at) as date,
-                model_used,
-                AVG(rating) as daily_avg,
-                COUNT(*) as daily_count
-            FROM feedback
-            WHERE created_at >= ?
-            GROUP BY DATE(created_at), model_used
-            ORDER BY date DESC, daily_avg DESC
-        """, (cutoff_date,))
-
-        trends = {}
-        for row in c.fetchall():
-            date, model, daily_avg, daily_count = row
-            if model not in trends:
-                trends[model] = []
+        else:
             trends[model].append({
                 "date": date,
-                "avg_rating": round(daily_avg, 2),
-                "count": daily_count
+                "avg_rating": avg_rating,
+                "count": total
             })
 
-        # Análisis de tipos de error por modelo
-        error_analysis = _analyze_error_patterns(conn, cutoff_date)
-
-        # Generar sugerencias de mejora
-        suggestions = _generate_suggestions(model_stats, error_analysis)
-
-        return {
-            "period_days": days,
-            "analyzed_at": datetime.now().isoformat(),
-            "model_performance": model_stats,
-            "trends": trends,
-            "error_analysis": error_analysis,
-            "suggestions": suggestions,
-            "summary": {
-                "total_feedback": sum(m["total_feedback"] for m in model_stats.values()),
-                "best_model": max(model_stats.keys(), key=lambda x: model_stats[x]["avg_rating"]) if model_stats else None,
-                "worst_model": min(model_stats.keys(), key=lambda x: model_stats[x]["avg_rating"]) if model_stats else None
-            }
-        }
+    # Análisis de tipos de error por modelo
+    error_analysis = _analyze_error_patterns(conn, cutoff_ts)
 
+    summary = {
+        "total_feedback": total_fb,
+        "best_model": best_model,
+        "worst_model": worst_model
+    }
 
-def _analyze_error_patterns(conn: sqlite3.Connection, cutoff_date: datetime) -> Dict[str, Any]:
-    """Analiza patrones de error en el feedback."""
-    c = conn.cursor()
+    # Generar sugerencias de mejora
+    suggestions = _generate_suggestions(model_stats, error_analysis, summary)
 
-    # Comentarios que mencionan problemas específicos
-    error_patterns = {
-        "wrong_model": ["equivocado", "mal modelo", "tocaba", "debía ser", "wrong model"],
-        "too_slow": ["lento", "slow", "demasiado tiempo", "esperar"],
-        "poor_quality": ["malo", "pobre", "inútil", "basura", "terrible"],
-        "incomplete": ["incompleto", "falta", "inacabado", "corto"],
-        "off_topic": ["tema", "irrelevante", "off topic", "no responde"]
+    return {
+        "period_days": days,
+        "analyzed_at": datetime.now().isoformat(),
+        "model_performance": model_stats,
+        "trends": dict(trends),
+        "error_analysis": error_analysis,
+        "suggestions": suggestions,
+        "summary": summary
     }
 
-    analysis = {}
 
-    for error_type, keywords in error_patterns.items():
-        # Crear placeholders para cada keyword
-        placeholders = " OR ".join(["f.comment LIKE ?" for _ in keywords])
-        
-        c.execute(f"""
-            SELECT f.model_used, COUNT(*) as count
-            FROM feedback f
-            WHERE f.created_at >= ?
-              AND f.rating <= 3
-              AND ({placeholders})
-            GROUP BY f.model_used
-        """, (cutoff_date, *(f"%{kw}%" for kw in keywords)))
+def analyze_performance_json(days: int = 7) -> bytes:
+    """analyze_performance ya serializado a JSON con orjson (para respuestas HTTP directas)."""
+    # OPT_NON_STR_KEYS: model_used puede ser NULL y terminar como clave None
+    return orjson.dumps(analyze_performance(days), option=orjson.OPT_NON_STR_KEYS)
+
+
+def _analyze_error_patterns(conn: sqlite3.Connection, cutoff_ts: int) -> Dict[str, Any]:
+    """Analiza patrones de error en el feedback."""
+    c = conn.cursor()
+
+    c.execute(_SQL_ERROR_COMMENTS, (cutoff_ts,))
+
+    analysis = {error_type: {} for error_type in _ERROR_RE}
 
-        analysis[error_type] = {row[0]: row[1] for row in c.fetchall()}
+    for model, comment in c:
+        for error_type, pattern in _ERROR_RE.items():
+            if pattern.search(comment):
+                counts = analysis[error_type]
+                counts[model] = counts.get(model, 0) + 1
 
     return analysis
 
 
-def _generate_suggestions(model_stats: Dict[str, Any], error_analysis: Dict[str, Any]) -> List[str]:
+def _generate_suggestions(model_stats: Dict[str, Any], error_analysis: Dict[str, Any],
+                          summary: Dict[str, Any]) -> List[str]:
     """Genera sugerencias de mejora basadas en el análisis."""
     suggestions = []
 
     if not model_stats:
         return ["No hay suficiente feedback para generar sugerencias."]
 
-    # Encontrar el mejor y peor modelo
-    best_model = max(model_stats.keys(), key=lambda x: model_stats[x]["avg_rating"])
-    worst_model = min(model_stats.keys(), key=lambda x: model_stats[x]["avg_rating"])
+    # Mejor y peor modelo (ya calculados en el resumen)
+    best_model = summary["best_model"]
+    worst_model = summary["worst_model"]
+    best_avg = model_stats[best_model]["avg_rating"]
+    worst_avg = model_stats[worst_model]["avg_rating"]
 
     # Sugerencias basadas en rendimiento
-    if model_stats[best_model]["avg_rating"] > 4.0:
-        suggestions.append(f"🎯 {best_model} está funcionando excelente (rating: {model_stats[best_model]['avg_rating']})")
+    if best_avg > 4.0:
+        suggestions.append(f"🎯 {best_model} está funcionando excelente (rating: {best_avg})")
 
-    if model_stats[worst_model]["avg_rating"] < 3.0:
-        suggestions.append(f"⚠️  {worst_model} necesita mejora urgente (rating: {model_stats[worst_model]['avg_rating']})")
+    if worst_avg < 3.0:
+        suggestions.append(f"⚠️  {worst_model} necesita mejora urgente (rating: {worst_avg})")
 
-    # Sugerencias basadas en errores
+    # Sugerencias basadas en errores (max sobre items: modelo y conteo en una sola pasada)
     for error_type, models in error_analysis.items():
         if models:
-            worst_performing = max(models.keys(), key=lambda x: models[x])
-            suggestions.append(f"🔧 Alto {error_type.replace('_', ' ')} en {worst_performing} ({models[worst_performing]} casos)")
+            worst_performing, cases = max(models.items(), key=itemgetter(1))
+            suggestions.append(f"🔧 Alto {error_type.replace('_', ' ')} en {worst_performing} ({cases} casos)")
 
     # Sugerencias generales
-    total_feedback = sum(m["total_feedback"] for m in model_stats.values())
-    if total_feedback < 10:
+    if summary["total_feedback"] < 10:
         suggestions.append("📊 Necesitas más feedback (mínimo 10 evaluaciones) para análisis confiable")
 
     # Balance de carga
-    if len(model_stats) > 1:
-        ratings = [m["avg_rating"] for m in model_stats.values()]
-        if max(ratings) - min(ratings) > 1.0:
-            suggestions.append("⚖️  Gran diferencia de calidad entre modelos - considera rebalancear prioridades")
+    if len(model_stats) > 1 and best_avg - worst_avg > 1.0:
+        suggestions.append("⚖️  Gran diferencia de calidad entre modelos - considera rebalancear prioridades")
 
     return suggestions
 
@@ -213,18 +388,11 @@ def get_recent_feedback(limit: int = 10) -> List[Dict[str, Any]]:
     """Obtiene los feedback más recientes."""
     with _get_conn() as conn:
         c = conn.cursor()
-        c.execute("""
-            SELECT f.id, f.message_id, f.session_id, f.rating, f.comment, f.model_used, f.created_at,
-                   m.message as original_message
-            FROM feedback f
-            JOIN messages m ON f.message_id = m.id
-            ORDER BY f.created_at DESC
-            LIMIT ?
-        """, (limit,))
+        c.execute(_SQL_RECENT_FEEDBACK, (limit,))
 
         feedback_list = []
         for row in c.fetchall():
-            fid, mid, sid, rating, comment, model, created_at, original_msg = row
+            fid, mid, sid, rating, comment, model, created_at, msg_head, msg_len = row
             feedback_list.append({
                 "feedback_id": fid,
                 "message_id": mid,
@@ -233,7 +401,7 @@ def get_recent_feedback(limit: int = 10) -> List[Dict[str, Any]]:
                 "comment": comment,
                 "model_used": model,
                 "created_at": created_at,
-                "original_message": original_msg[:100] + "..." if len(original_msg) > 100 else original_msg
+                "original_message": msg_head + "..." if msg_len > 100 else msg_head
             })
 
         return feedback_list
@@ -2,17 +2,53 @@
 Intelligent Router - Sprint 2
 Routing basado en scoring con reglas claras y sin conflictos.
 """
-from typing import Dict, Any, List
+import heapq
+import re
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Any, FrozenSet, Tuple
 from config.model_profiles import _DATA as model_profiles
-from nova.core.semantic_analyzer import analyze
+from nova.core.semantic_analyzer import analyze, _analysis_window
 from utils.logging import get_logger
 
 logger = get_logger("core.intelligent_router")
 
+# (modelo, priority, capabilities) resuelto una sola vez al importar los perfiles
+_MODEL_INDEX = tuple(
+    (name, prof.get("priority", 50), frozenset(prof.get("capabilities", [])))
+    for name, prof in model_profiles.items()
+)
+
+# analyze() es puro: los prompts repetidos reutilizan sus señales. La clave es la
+# ventana (inicio y final) que analyze() realmente lee: la caché no retiene mensajes enormes.
+# El dict devuelto es compartido entre llamadas; route() solo lo lee.
+_analyze = lru_cache(maxsize=512)(analyze)
+
+# Frases vagas que piden clarificación: una sola alternación compilada
+# (búsqueda por subcadena sin distinguir mayúsculas, igual que `p in message.lower()`)
+_VAGUE_PHRASES = ["ayudame", "ayuda", "help", "ayúdame"]
+_VAGUE_RE = re.compile("|".join(map(re.escape, _VAGUE_PHRASES)), re.IGNORECASE)
+
+# Señales que consultan las reglas de scoring; cada una ocupa un bit de la máscara
+_SIGNAL_BITS = (
+    "mentions_image", "mentions_architecture", "mentions_strategy",
+    "wants_code_generation", "mentions_code", "mentions_debug",
+    "mentions_complex", "is_short", "has_question",
+)
+
 
 def score_model_for_query(model_name: str, signals: Dict[str, Any]) -> int:
+    """Calcula score para un modelo basado en señales semánticas."""
+    score = _SCORE_TABLE[_signal_mask(signals)].get(model_name)
+    if score is not None:
+        return score
+    prof = model_profiles.get(model_name, {})
+    return _score(model_name, prof.get("priority", 50), frozenset(prof.get("capabilities", [])), signals)
+
+
+def _score(model_name: str, priority: int, caps: FrozenSet[str], signals: Dict[str, Any]) -> int:
     """
-    Calcula score para un modelo basado en señales semánticas.
+    Score de un modelo con su priority y capabilities ya resueltas.
     
     REGLAS DE PRIORIDAD (de mayor a menor):
     1. Imagen -> moondream (score 1000)
@@ -22,11 +58,8 @@ def score_model_for_query(model_name: str, signals: Dict[str, Any]) -> int:
     5. Análisis complejo -> mixtral (score base + 120)
     6. Debug rápido -> dolphin (score base + 80)
     """
-    prof = model_profiles.get(model_name, {})
-    caps = prof.get("capabilities", [])
-    
     # Score base desde perfil
-    score = prof.get("priority", 50)
+    score = priority
     
     # ==========================================
     # REGLA 1: IMAGEN (prioridad máxima)
@@ -105,6 +138,33 @@ def score_model_for_query(model_name: str, signals: Dict[str, Any]) -> int:
     return score
 
 
+def _signal_mask(signals: Dict[str, Any]) -> int:
+    """Codifica las señales relevantes para el scoring como una máscara de bits."""
+    return sum(1 << i for i, key in enumerate(_SIGNAL_BITS) if signals.get(key))
+
+
+def _top_models_for_mask(mask: int) -> Tuple[Tuple[str, int], ...]:
+    """Top 3 (modelo, score) para una combinación de señales."""
+    scores = list(_SCORE_TABLE[mask].items())
+    
+    # Top 3 por score (mismo orden que sorted(..., reverse=True)[:3])
+    return tuple(heapq.nlargest(3, scores, key=itemgetter(1)))
+
+
+def _build_score_table() -> Tuple[Dict[str, int], ...]:
+    """Ejecuta la cascada de reglas una vez por máscara (2^9 = 512) y modelo."""
+    table = []
+    for mask in range(1 << len(_SIGNAL_BITS)):
+        signals = {key: True for i, key in enumerate(_SIGNAL_BITS) if mask >> i & 1}
+        table.append({name: _score(name, priority, caps, signals) for name, priority, caps in _MODEL_INDEX})
+    return tuple(table)
+
+
+# Scores precalculados: _SCORE_TABLE[mask][modelo] y el top 3 de cada máscara
+_SCORE_TABLE = _build_score_table()
+_TOP_TABLE = tuple(_top_models_for_mask(mask) for mask in range(len(_SCORE_TABLE)))
+
+
 def route(message: str, has_image: bool = False) -> Dict[str, Any]:
     """
     Rutea un mensaje al modelo más apropiado.
@@ -117,9 +177,11 @@ def route(message: str, has_image: bool = False) -> Dict[str, Any]:
             "alternatives": [...]
         }
     """
+    preview = message[:100]
+    
     # CASO ESPECIAL: Imagen
     if has_image:
-        logger.info("routing_image", message=message[:100])
+        logger.info("routing_image", message=preview)
         return {
             "model": "llava:7b",
             "confidence": 100,
@@ -128,47 +190,40 @@ def route(message: str, has_image: bool = False) -> Dict[str, Any]:
         }
     
     # Análisis semántico
-    signals = analyze(message)
+    signals = _analyze(_analysis_window(message))
     
     logger.info(
         "semantic_signals",
-        message=message[:100],
+        message=preview,
         signals={k: v for k, v in signals.items() if v}  # Solo señales True
     )
     
     # CASO ESPECIAL: Clarificación
-    vague_phrases = ["ayudame", "ayuda", "help", "ayúdame"]
-    if any(p in message.lower() for p in vague_phrases):
-        logger.info("needs_clarification", message=message[:100])
+    if _VAGUE_RE.search(message):
+        logger.info("needs_clarification", message=preview)
         return {
             "status": "needs_clarification",
             "message": "¿Podrías darme más detalles sobre qué necesitas?"
         }
     
     if signals.get("is_short") and not signals.get("has_question") and len(message.split()) <= 1:
-        logger.info("needs_clarification_short", message=message[:100])
+        logger.info("needs_clarification_short", message=preview)
         return {
             "status": "needs_clarification",
             "message": "¿Podrías darme más detalles?"
         }
     
-    # Scoring de modelos
-    scores: List[Dict[str, Any]] = []
-    for model_name in model_profiles.keys():
-        model_score = score_model_for_query(model_name, signals)
-        scores.append({"model": model_name, "score": model_score})
-    
-    # Ordenar por score
-    scores = sorted(scores, key=lambda x: x["score"], reverse=True)
+    # Scoring de modelos (precalculado por combinación de señales)
+    top = _TOP_TABLE[_signal_mask(signals)]
     
-    best = scores[0]
+    best_model, best_score = top[0]
     alternatives = [
-        {"model": s["model"], "score": s["score"]} 
-        for s in scores[1:3]
+        {"model": name, "score": score}
+        for name, score in top[1:]
     ]
     
     # Calcular confianza (0-100)
-    confidence = min(100, max(50, 50 + (best["score"] - 50)))
+    confidence = min(100, max(50, 50 + (best_score - 50)))
     
     # Reasoning legible
     active_signals = [k for k, v in signals.items() if v]
@@ -176,14 +231,14 @@ def route(message: str, has_image: bool = False) -> Dict[str, Any]:
     
     logger.info(
         "routing_decision",
-        model=best["model"],
-        score=best["score"],
+        model=best_model,
+        score=best_score,
         confidence=confidence,
         alternatives=alternatives
     )
     
     return {
-        "model": best["model"],
+        "model": best_model,
         "confidence": confidence,
         "reasoning": reasoning,
         "alternatives": alternatives
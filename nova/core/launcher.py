@@ -1,15 +1,19 @@
-import json
 import os
+import select
 import shutil
 import signal
 import socket
 import subprocess
 import sys
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from utils.logging import get_logger
 from config.settings import settings
@@ -17,13 +21,20 @@ from config.settings import settings
 logger = get_logger("core.launcher")
 PID_FILE = Path(settings.pid_path)
 
+# Sesión HTTP persistente: los sondeos de salud a Ollama reutilizan la conexión keep-alive
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0))
+
+# Último resultado de salud por URL: (instante monotónico, ok); evita sondear en bucles cerrados
+_HEALTH_TTL = 5.0
+_HEALTH_CACHE: dict = {}
+
 
 def _read_pid_file() -> dict:
     if not PID_FILE.exists():
         return {}
     try:
-        with PID_FILE.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        return orjson.loads(PID_FILE.read_bytes())
     except Exception:
         return {}
 
@@ -37,8 +48,7 @@ def _write_pid_file(uvicorn_pid: Optional[int], ollama_pid: Optional[int], port:
         "ollama_managed": ollama_managed,
         "written_at": time.time()
     }
-    with PID_FILE.open("w", encoding="utf-8") as f:
-        json.dump(data, f)
+    PID_FILE.write_bytes(orjson.dumps(data))
     logger.info("pid_file_written", path=str(PID_FILE), data=data)
 
 
@@ -52,6 +62,35 @@ def _is_process_running(pid: int) -> bool:
         return True
 
 
+def _wait_for_exit(pid: int, timeout: float) -> bool:
+    """Block until ``pid`` exits or ``timeout`` elapses; True if it exited."""
+    # Linux: un pidfd se vuelve legible al terminar el proceso, sin sondeo
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                return bool(select.select([fd], [], [], timeout)[0])
+            finally:
+                os.close(fd)
+
+    # Resto de plataformas: sondeo con espera creciente (10ms → 500ms)
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        if not _is_process_running(pid):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.5)
+
+
 def _terminate_pid(pid: int, name: str) -> None:
     try:
         os.kill(pid, signal.SIGTERM)
@@ -62,71 +101,92 @@ def _terminate_pid(pid: int, name: str) -> None:
         logger.warning("process_terminate_permission_denied", name=name, pid=pid)
         return
 
-    deadline = time.time() + 10
-    while time.time() < deadline:
-        if not _is_process_running(pid):
-            logger.info("process_stopped", name=name, pid=pid)
-            return
-        time.sleep(0.5)
+    if _wait_for_exit(pid, 10):
+        logger.info("process_stopped", name=name, pid=pid)
+        return
 
     try:
         os.kill(pid, signal.SIGKILL)
+        _wait_for_exit(pid, 2)
         logger.info("process_killed", name=name, pid=pid)
     except Exception as e:
         logger.warning("process_kill_failed", name=name, pid=pid, error=str(e))
 
 
+@lru_cache(maxsize=1)
+def _ollama_bin() -> Optional[str]:
+    # La ruta del binario no cambia durante la vida del proceso: un solo recorrido de $PATH
+    return shutil.which("ollama")
+
+
 def _is_ollama_installed() -> bool:
-    return shutil.which("ollama") is not None
+    return _ollama_bin() is not None
 
 
 def _is_ollama_running(health_url: str = "http://localhost:11434/api/tags") -> bool:
+    cached = _HEALTH_CACHE.get(health_url)
+    if cached and time.monotonic() - cached[0] < _HEALTH_TTL:
+        return cached[1]
     try:
-        r = requests.get(health_url, timeout=1)
-        return r.status_code == 200
+        r = _SESSION.get(health_url, timeout=1)
+        ok = r.status_code == 200
     except Exception:
-        return False
+        ok = False
+    _HEALTH_CACHE[health_url] = (time.monotonic(), ok)
+    return ok
 
 
 def _wait_for_ollama(health_url: str, timeout: int = 60) -> None:
     logger.info("waiting_for_ollama_health", url=health_url, timeout_seconds=timeout)
-    deadline = time.time() + timeout
-    while time.time() < deadline:
+    deadline = time.monotonic() + timeout
+    # Backoff exponencial 100ms → 3s: Ollama suele estar listo en menos de un segundo
+    delay = 0.1
+    while time.monotonic() < deadline:
         try:
-            r = requests.get(health_url, timeout=2)
+            r = _SESSION.get(health_url, timeout=2)
             if r.status_code == 200:
+                _HEALTH_CACHE[health_url] = (time.monotonic(), True)
                 logger.info("ollama_health_ok")
                 return
         except Exception:
             logger.debug("ollama_health_check_failed")
-        time.sleep(3)
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 1.5, 3.0)
     raise RuntimeError(f"Ollama no respondió saludable en {timeout}s en {health_url}")
 
 
 def _start_ollama_serve() -> subprocess.Popen:
     logger.info("starting_ollama_serve")
-    p = subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Sesión propia: un Ctrl+C en la terminal del launcher no llega a ollama
+    p = subprocess.Popen(
+        [_ollama_bin() or "ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
     logger.info("ollama_serve_started", pid=p.pid)
     return p
 
 
 def _pull_model(model: str) -> None:
     logger.info("pull_model_start", model=model)
-    # Try to run pull; if ollama is unavailable or pull fails, we still simulate progress
+    # Try to run pull; if ollama is unavailable or pull fails, startup continues
     try:
-        subprocess.run(["ollama", "pull", model], check=False)
+        subprocess.run([_ollama_bin() or "ollama", "pull", model], check=False)
     except Exception:
         logger.warning("pull_model_cmd_failed", model=model)
-    # Simple progress indicator (simulated) via structured logs
-    for i in range(0, 101, 10):
-        logger.info("startup_progress", step=f"pulling_model", model=model, percent=i)
-        time.sleep(0.05)
     logger.info("pull_model_done", model=model)
 
 
+def _probe_socket() -> socket.socket:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name == "posix":
+        # Ignorar puertos en TIME_WAIT (en POSIX no permite compartir un puerto en escucha)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    return s
+
+
 def _find_free_port(start: int = 8000, end: int = 8010) -> Optional[int]:
-    for port in range(start, end + 1):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    # Un único socket para todo el rango: un bind fallido lo deja sin asignar y reutilizable
+    with _probe_socket() as s:
+        for port in range(start, end + 1):
             try:
                 s.bind(("0.0.0.0", port))
                 return port
@@ -136,7 +196,7 @@ def _find_free_port(start: int = 8000, end: int = 8010) -> Optional[int]:
 
 
 def _is_port_free(port: int) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with _probe_socket() as s:
         try:
             s.bind(("0.0.0.0", port))
             return True
@@ -144,6 +204,23 @@ def _is_port_free(port: int) -> bool:
             return False
 
 
+def _select_port(port: int) -> int:
+    """Return ``port`` if free, otherwise the first free port in the configured web range."""
+    try:
+        if port and _is_port_free(port):
+            free_port = port
+        else:
+            free_port = _find_free_port(settings.web_port_start, settings.web_port_end)
+    except PermissionError:
+        # En entornos restringidos, intentar sin validación de socket
+        free_port = port or settings.web_port_start
+
+    if free_port is None:
+        logger.error("no_free_port")
+        raise RuntimeError(f"No free port found between {settings.web_port_start} and {settings.web_port_end}")
+    return free_port
+
+
 def start(port: int = 8000) -> dict:
     """Start NOVA system: ensure ollama, pull models, healthcheck, find port and start uvicorn.
 
@@ -179,28 +256,14 @@ def start(port: int = 8000) -> dict:
     else:
         logger.info("ollama_already_running")
 
-    # Auto-pull models
-    models = settings.models
-    for m in models:
-        _pull_model(m)
-
-    # Health check loop
-    _wait_for_ollama(settings.ollama_health_url, timeout=90)
-
-    # Find free port in range
-    free_port = None
-    try:
-        if port and _is_port_free(port):
-            free_port = port
-        else:
-            free_port = _find_free_port(settings.web_port_start, settings.web_port_end)
-    except PermissionError:
-        # En entornos restringidos, intentar sin validación de socket
-        free_port = port or settings.web_port_start
-
-    if free_port is None:
-        logger.error("no_free_port")
-        raise RuntimeError(f"No free port found between {settings.web_port_start} and {settings.web_port_end}")
+    # Pulls, espera de salud y búsqueda de puerto no dependen entre sí: se solapan en hilos
+    models = settings.models or []
+    with ThreadPoolExecutor(max_workers=min(len(models), 4) + 2) as ex:
+        port_future = ex.submit(_select_port, port)
+        health_future = ex.submit(_wait_for_ollama, settings.ollama_health_url, 90)
+        list(ex.map(_pull_model, models))
+        health_future.result()
+        free_port = port_future.result()
 
     logger.info("system_ready", port=free_port)
     ascii_art = (
@@ -217,7 +280,8 @@ def start(port: int = 8000) -> dict:
     uvicorn_proc: Optional[subprocess.Popen] = None
     try:
         uvicorn_cmd = [sys.executable, "-m", "uvicorn", "nova.api.routes:app", "--host", "0.0.0.0", "--port", str(free_port)]
-        uvicorn_proc = subprocess.Popen(uvicorn_cmd)
+        # Desacoplado del launcher: sobrevive a su salida y stop() lo detiene vía PID_FILE
+        uvicorn_proc = subprocess.Popen(uvicorn_cmd, start_new_session=True)
         _write_pid_file(uvicorn_proc.pid if uvicorn_proc else None, ollama_proc.pid if ollama_proc else None, free_port, ollama_managed)
         logger.info("uvicorn_started", port=free_port, pid=uvicorn_proc.pid if uvicorn_proc else None)
         
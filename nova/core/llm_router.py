@@ -1,11 +1,76 @@
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import hashlib
+import threading
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from config.settings import settings
 from nova.core import intelligent_router
 from utils.logging import get_logger
 
 logger = get_logger("core.llm_router")
 
+# Sesión HTTP persistente hacia el router externo (una conexión keep-alive por turno, no un handshake)
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0))
+
+# Cliente asíncrono para la ruta de la API; se crea dentro del event loop que lo usa
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(timeout=3.0, limits=httpx.Limits(max_keepalive_connections=10))
+    return _ASYNC_CLIENT
+
+
+async def aclose() -> None:
+    """Cerrar el cliente asíncrono (al apagar la aplicación)."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+
+
+# Decisiones del router externo ya obtenidas, por (hash del mensaje normalizado, has_image).
+# Solo se guardan respuestas válidas del LLM; los fallbacks heurísticos no se cachean.
+_ROUTE_CACHE_SIZE = 4096
+_ROUTE_CACHE: "OrderedDict[Tuple[bytes, bool], Dict[str, Any]]" = OrderedDict()
+_ROUTE_CACHE_LOCK = threading.Lock()
+
+
+def _route_key(message: str, has_image: bool) -> Tuple[bytes, bool]:
+    normalized = " ".join(message.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest(), has_image
+
+
+def _cached_route(key: Tuple[bytes, bool]) -> Optional[Dict[str, Any]]:
+    with _ROUTE_CACHE_LOCK:
+        data = _ROUTE_CACHE.get(key)
+        if data is None:
+            return None
+        _ROUTE_CACHE.move_to_end(key)
+    logger.info("llm_route_cache_hit", model=data.get("model"))
+    return dict(data)
+
+
+def _store_route(key: Tuple[bytes, bool], data: Dict[str, Any]) -> None:
+    with _ROUTE_CACHE_LOCK:
+        _ROUTE_CACHE[key] = dict(data)
+        _ROUTE_CACHE.move_to_end(key)
+        if len(_ROUTE_CACHE) > _ROUTE_CACHE_SIZE:
+            _ROUTE_CACHE.popitem(last=False)
+
+
+def _accept_route(status_code: int, data: Any) -> Optional[Dict[str, Any]]:
+    # basic validation
+    if status_code == 200 and isinstance(data, dict) and "model" in data:
+        logger.info("llm_route_success", model=data.get("model"), confidence=data.get("confidence"))
+        return data
+    return None
+
 
 def route_with_llm(message: str, has_image: bool = False) -> Dict[str, Any]:
     """Try using an external LLM-based routing decision. If disabled or request times out (>3s) fall back to heuristic router.
@@ -16,16 +81,44 @@ def route_with_llm(message: str, has_image: bool = False) -> Dict[str, Any]:
     if not settings.USE_LLM_BRAIN:
         return intelligent_router.route(message, has_image)
 
+    key = _route_key(message, has_image)
+    cached = _cached_route(key)
+    if cached is not None:
+        return cached
+
     try:
         payload = {"message": message, "has_image": has_image}
         # Timeout set to 3s as requested; if LLM router doesn't respond, fallback
-        r = requests.post(settings.llm_router_url, json=payload, timeout=3)
-        if r.status_code == 200:
-            data = r.json()
-            # basic validation
-            if isinstance(data, dict) and "model" in data:
-                logger.info("llm_route_success", model=data.get("model"), confidence=data.get("confidence"))
-                return data
+        r = _SESSION.post(settings.llm_router_url, json=payload, timeout=3)
+        data = _accept_route(r.status_code, r.json() if r.status_code == 200 else None)
+        if data is not None:
+            _store_route(key, data)
+            return data
+    except Exception as e:
+        logger.warning("llm_route_failed", error=str(e))
+
+    # fallback to heuristic router
+    logger.info("llm_route_fallback", message=message[:120])
+    return intelligent_router.route(message, has_image)
+
+
+async def route_with_llm_async(message: str, has_image: bool = False) -> Dict[str, Any]:
+    """Same as route_with_llm, but awaits the external router without blocking the event loop."""
+    if not settings.USE_LLM_BRAIN:
+        return intelligent_router.route(message, has_image)
+
+    key = _route_key(message, has_image)
+    cached = _cached_route(key)
+    if cached is not None:
+        return cached
+
+    try:
+        payload = {"message": message, "has_image": has_image}
+        r = await _get_async_client().post(settings.llm_router_url, json=payload)
+        data = _accept_route(r.status_code, r.json() if r.status_code == 200 else None)
+        if data is not None:
+            _store_route(key, data)
+            return data
     except Exception as e:
         logger.warning("llm_route_failed", error=str(e))
 
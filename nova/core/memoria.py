@@ -1,6 +1,8 @@
 import sqlite3
+import threading
+from collections import deque
 from contextlib import contextmanager
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 import os
 
 from utils.logging import get_logger
@@ -8,23 +10,132 @@ from config.settings import settings
 
 logger = get_logger("core.memoria")
 
+# SQL de las rutas calientes: el texto idéntico hace que sqlite3 reutilice
+# el statement ya compilado de su caché por conexión.
+_SQL_INSERT_MESSAGE = (
+    "INSERT INTO messages (session_id, role, message, model_used, reasoning, confidence) VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SQL_SELECT_CONVERSATION = (
+    "SELECT id, session_id, role, message, model_used, reasoning, confidence, created_at "
+    "FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?"
+)
+_SQL_SEARCH_MESSAGES = "SELECT id, session_id, role, message FROM messages WHERE message LIKE ? LIMIT ?"
+# Búsqueda por subcadena sobre el índice trigram de messages_fts (mismo orden por id que el LIKE)
+_SQL_SEARCH_MESSAGES_FTS = (
+    "SELECT m.id, m.session_id, m.role, m.message FROM messages_fts "
+    "JOIN messages m ON m.id = messages_fts.rowid "
+    "WHERE messages_fts MATCH ? ORDER BY messages_fts.rowid LIMIT ?"
+)
+# El tokenizer trigram solo indexa términos de 3 o más caracteres
+_FTS_MIN_KEYWORD = 3
+
+# PRAGMAs aplicados una sola vez al abrir la conexión: WAL evita el doble fsync
+# por commit y permite lecturas concurrentes con la escritura.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+    # Tras cada checkpoint el -wal se trunca a ~6MB en vez de quedarse en su máximo histórico
+    "PRAGMA journal_size_limit=6144000",
+)
+
+# Conexión única de larga vida, compartida entre hilos y protegida por lock.
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_conn_lock = threading.RLock()
+
+# Versión del esquema que deja init_db (PRAGMA user_version). Subirla con cada
+# migración nueva para que las bases ya existentes la ejecuten.
+_SCHEMA_VERSION = 4
+# Columnas de response_cache (esquema actual), en el orden de la tabla
+_RESPONSE_CACHE_COLUMNS = (
+    "cache_key", "query", "model_name", "response", "metadata",
+    "created_at", "expires_at", "hit_count", "last_accessed",
+)
+# TTL asignado a las entradas migradas desde la tabla de caché antigua (7 días)
+_LEGACY_CACHE_TTL = 7 * 24 * 60 * 60
+# Ruta ya inicializada en este proceso: las llamadas repetidas a init_db no hacen nada
+_initialized_path: Optional[str] = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Return the shared connection, reopening it if settings.db_path changed."""
+    global _conn, _conn_path
+    if _conn is None or _conn_path != settings.db_path:
+        if _conn is not None:
+            _close_conn(_conn)
+        os.makedirs(os.path.dirname(settings.db_path), exist_ok=True)
+        _conn = sqlite3.connect(settings.db_path, check_same_thread=False, cached_statements=256)
+        for pragma in _CONNECTION_PRAGMAS:
+            _conn.execute(pragma)
+        _conn_path = settings.db_path
+    return _conn
+
+
+def _close_conn(conn: sqlite3.Connection) -> None:
+    # PRAGMA optimize al cerrar: SQLite reanaliza solo las tablas cuyas estadísticas quedaron viejas
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logger.warning("db_optimize_failed", error=str(e))
+    conn.close()
+
+
+def close_db() -> None:
+    """Close the shared connection (app shutdown)."""
+    global _conn, _conn_path
+    with _conn_lock:
+        if _conn is not None:
+            _close_conn(_conn)
+            _conn = None
+            _conn_path = None
+
+
+class _PendingWrite:
+    """Un INSERT de messages a la espera del siguiente commit agrupado."""
+
+    __slots__ = ("params", "message_id", "error", "done")
+
+    def __init__(self, params: tuple):
+        self.params = params
+        self.message_id: Optional[int] = None
+        self.error: Optional[Exception] = None
+        self.done = False
+
+
+# Escrituras encoladas por save_conversation. Quien obtiene el lock de la conexión
+# escribe todas las pendientes en una sola transacción (un commit para el lote).
+_pending_writes: deque = deque()
+_MAX_WRITE_BATCH = 64
+
 
 @contextmanager
 def _get_conn():
-    os.makedirs(os.path.dirname(settings.db_path), exist_ok=True)
-    conn = sqlite3.connect(settings.db_path)
-    try:
-        yield conn
-    finally:
-        conn.commit()
-        conn.close()
+    with _conn_lock:
+        conn = _connect()
+        try:
+            yield conn
+        finally:
+            conn.commit()
 
 
 def init_db() -> None:
     """Create DB and tables if they don't exist."""
+    global _initialized_path
+    if _initialized_path == settings.db_path:
+        return
     with _get_conn() as conn:
         c = conn.cursor()
 
+        # Esquema ya migrado por un proceso anterior: basta con leer user_version
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] >= _SCHEMA_VERSION:
+            _initialized_path = settings.db_path
+            logger.info("db_schema_current", path=settings.db_path, version=_SCHEMA_VERSION)
+            return
+
         # Tabla messages actualizada
         c.execute(
             """
@@ -64,6 +175,43 @@ def init_db() -> None:
                 except Exception:
                     pass
 
+        # Índice FTS5 (trigram) sobre messages.message para search_messages; se mantiene con triggers
+        try:
+            c.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+            fts_exists = c.fetchone() is not None
+            c.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                "message, content='messages', content_rowid='id', tokenize='trigram')"
+            )
+            c.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message);
+                END
+                """
+            )
+            c.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+                END
+                """
+            )
+            c.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF message ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+                    INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message);
+                END
+                """
+            )
+            if not fts_exists:
+                # Indexar los mensajes que ya existían
+                c.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            # SQLite sin FTS5/trigram: search_messages sigue usando LIKE
+            logger.warning("messages_fts_unavailable", error=str(e))
+
         # Tabla feedback mejorada
         c.execute(
             """
@@ -89,6 +237,28 @@ def init_db() -> None:
             except Exception:
                 pass
 
+        # created_at_ts: created_at como segundos enteros (el texto de created_at interpretado
+        # como UTC, igual que strftime('%s')) para filtrar ventanas con comparación numérica
+        if "created_at_ts" not in feedback_cols:
+            try:
+                c.execute("ALTER TABLE feedback ADD COLUMN created_at_ts INTEGER")
+                c.execute("UPDATE feedback SET created_at_ts = CAST(strftime('%s', created_at) AS INTEGER)")
+            except Exception:
+                pass
+
+        # Rellenar created_at_ts para inserts que no lo informan (p.ej. created_at por defecto)
+        c.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_feedback_created_at_ts
+            AFTER INSERT ON feedback
+            WHEN NEW.created_at_ts IS NULL
+            BEGIN
+                UPDATE feedback SET created_at_ts = CAST(strftime('%s', NEW.created_at) AS INTEGER)
+                WHERE id = NEW.id;
+            END
+            """
+        )
+
         # Tabla response_cache para Sprint 3 Día 3 - Caché Inteligente
         c.execute(
             """
@@ -102,7 +272,7 @@ def init_db() -> None:
                 expires_at TIMESTAMP,
                 hit_count INTEGER DEFAULT 0,
                 last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            ) WITHOUT ROWID
             """
         )
 
@@ -129,30 +299,31 @@ def init_db() -> None:
                     )
                 """)
 
-                # Migrar datos existentes
+                # Migrar datos existentes: filas calculadas por un generador y un solo executemany
                 import time
                 import hashlib
                 import json
 
-                c.execute("SELECT query_text, response_text, model_used, created_at FROM response_cache")
-                old_rows = c.fetchall()
-
-                for row in old_rows:
-                    query_text, response_text, model_used, created_at = row
-                    # Generar cache_key y otros campos
-                    cache_key = hashlib.sha256(f"{query_text}{model_used}".encode()).hexdigest()
-                    query_hash = hashlib.md5(query_text.encode()).hexdigest()
-                    created_timestamp = time.mktime(time.strptime(created_at, "%Y-%m-%d %H:%M:%S")) if isinstance(created_at, str) else time.time()
-                    expires_at = created_timestamp + (7 * 24 * 60 * 60)  # 7 días TTL
+                def _migrated_rows():
+                    for query_text, response_text, model_used, created_at in conn.execute(
+                        "SELECT query_text, response_text, model_used, created_at FROM response_cache"
+                    ):
+                        # Generar cache_key y otros campos
+                        cache_key = hashlib.sha256(f"{query_text}{model_used}".encode()).hexdigest()
+                        query_hash = hashlib.md5(query_text.encode()).hexdigest()
+                        created_timestamp = time.mktime(time.strptime(created_at, "%Y-%m-%d %H:%M:%S")) if isinstance(created_at, str) else time.time()
+                        expires_at = created_timestamp + _LEGACY_CACHE_TTL
 
-                    response_json = json.dumps({"text": response_text})
-                    metadata_json = json.dumps({"migrated": True, "old_created_at": created_at})
+                        response_json = json.dumps({"text": response_text})
+                        metadata_json = json.dumps({"migrated": True, "old_created_at": created_at})
+                        yield (cache_key, query_hash, model_used, response_json, created_timestamp, expires_at, 0, created_timestamp, metadata_json)
 
-                    c.execute("""
-                        INSERT INTO response_cache_new
-                        (cache_key, query_hash, model_name, response, created_at, expires_at, hit_count, last_accessed, metadata)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (cache_key, query_hash, model_used, response_json, created_timestamp, expires_at, 0, created_timestamp, metadata_json))
+                # La lectura usa su propio cursor (conn.execute): c queda libre para executemany
+                c.executemany("""
+                    INSERT INTO response_cache_new
+                    (cache_key, query_hash, model_name, response, created_at, expires_at, hit_count, last_accessed, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, _migrated_rows())
 
                 # Reemplazar tabla
                 c.execute("DROP TABLE response_cache")
@@ -162,6 +333,40 @@ def init_db() -> None:
         except Exception as e:
             logger.warning("cache_migration_failed", error=str(e))
 
+        # response_cache como tabla WITHOUT ROWID: las filas viven en el B-tree de cache_key
+        # (sin rowid + índice de PK duplicado). Las bases anteriores se reconstruyen una vez.
+        try:
+            c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'response_cache'")
+            row = c.fetchone()
+            c.execute("PRAGMA table_info(response_cache)")
+            cols = [r[1] for r in c.fetchall()]
+            if row and "WITHOUT ROWID" not in row[0].upper() and cols == list(_RESPONSE_CACHE_COLUMNS):
+                logger.info("migrating_cache_table_without_rowid")
+                c.execute(
+                    """
+                    CREATE TABLE response_cache_new (
+                        cache_key TEXT PRIMARY KEY,
+                        query TEXT NOT NULL,
+                        model_name TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        metadata TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        expires_at TIMESTAMP,
+                        hit_count INTEGER DEFAULT 0,
+                        last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) WITHOUT ROWID
+                    """
+                )
+                col_list = ", ".join(_RESPONSE_CACHE_COLUMNS)
+                c.execute(
+                    f"INSERT OR IGNORE INTO response_cache_new ({col_list}) "
+                    f"SELECT {col_list} FROM response_cache WHERE cache_key IS NOT NULL"
+                )
+                c.execute("DROP TABLE response_cache")
+                c.execute("ALTER TABLE response_cache_new RENAME TO response_cache")
+        except sqlite3.Error as e:
+            logger.warning("cache_without_rowid_migration_failed", error=str(e))
+
         # Tabla optimization_log para auto-optimización
         c.execute(
             """
@@ -188,16 +393,45 @@ def init_db() -> None:
             # Índices para caché inteligente
             c.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires_at ON response_cache(expires_at)")
             c.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_model ON response_cache(model_name)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_query_model ON response_cache(query, model_name)")
+            # Ninguna consulta filtra por query (las búsquedas van por cache_key): índice muerto
+            c.execute("DROP INDEX IF EXISTS idx_response_cache_query_model")
             # Índices para optimization_log
             c.execute("CREATE INDEX IF NOT EXISTS idx_optimization_model ON optimization_log(model_name)")
             c.execute("CREATE INDEX IF NOT EXISTS idx_optimization_created ON optimization_log(created_at)")
         except Exception:
             pass
 
+        # Estadísticas para el planificador tras migrar (analysis_limit acota el coste en tablas grandes)
+        c.execute("PRAGMA analysis_limit=400")
+        c.execute("ANALYZE")
+
+        c.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    _initialized_path = settings.db_path
     logger.info("db_initialized", path=settings.db_path)
 
 
+def _flush_pending_writes(conn: sqlite3.Connection) -> None:
+    """Write up to _MAX_WRITE_BATCH queued messages and commit them together (caller holds the lock)."""
+    batch = []
+    while _pending_writes and len(batch) < _MAX_WRITE_BATCH:
+        batch.append(_pending_writes.popleft())
+    try:
+        for item in batch:
+            try:
+                item.message_id = conn.execute(_SQL_INSERT_MESSAGE, item.params).lastrowid
+            except sqlite3.Error as e:
+                item.error = e
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        for item in batch:
+            item.error = e
+    finally:
+        for item in batch:
+            item.done = True
+
+
 def save_conversation(
     session_id: str,
     role: str,
@@ -206,27 +440,60 @@ def save_conversation(
     reasoning: Optional[str] = None,
     confidence: Optional[int] = None,
 ) -> int:
+    item = _PendingWrite((session_id, role, message, model_used, reasoning, confidence))
+    _pending_writes.append(item)
+    # Mientras otro hilo escribía, los mensajes encolados esperan al lock y el
+    # primero que lo obtiene los persiste todos: un solo commit por ráfaga.
     with _get_conn() as conn:
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO messages (session_id, role, message, model_used, reasoning, confidence) VALUES (?, ?, ?, ?, ?, ?)",
-            (session_id, role, message, model_used, reasoning, confidence),
-        )
-        last_id = c.lastrowid
+        while not item.done:
+            _flush_pending_writes(conn)
+    if item.error is not None:
+        raise item.error
+    last_id = item.message_id
     logger.info("message_saved", session_id=session_id, role=role, message_id=last_id)
     return last_id
 
 
-def get_conversation(session_id: str, limit: int = 20) -> List[Dict]:
+def save_conversations(rows: List[Tuple]) -> List[int]:
+    """Insert several messages with one executemany and a single commit.
+
+    Args:
+        rows: tuplas (session_id, role, message, model_used, reasoning, confidence)
+
+    Returns:
+        message_ids en el mismo orden que rows
+    """
+    if not rows:
+        return []
     with _get_conn() as conn:
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, session_id, role, message, model_used, reasoning, confidence, created_at FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
-            (session_id, limit),
-        )
-        rows = c.fetchall()
-    result = [
-        {
+        # Primero lo que ya estaba encolado por save_conversation, para conservar el orden
+        while _pending_writes:
+            _flush_pending_writes(conn)
+        try:
+            conn.executemany(_SQL_INSERT_MESSAGE, rows)
+            # Un solo escritor bajo el lock de la conexión: los ids del lote son consecutivos
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        except Exception:
+            conn.rollback()
+            raise
+    message_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    logger.info("messages_saved", count=len(message_ids))
+    return message_ids
+
+
+def iter_conversation(session_id: str, limit: int = 20) -> Iterator[Dict]:
+    """Yield the last ``limit`` messages of a session as dicts, newest first.
+
+    The query runs and all ``limit`` rows are fetched on the first ``next()``;
+    only the per-row dict construction is deferred until each item is consumed.
+    """
+    with _get_conn() as conn:
+        # Se leen las filas antes de soltar el lock; el generador puede reanudarse desde otro hilo
+        rows = conn.execute(_SQL_SELECT_CONVERSATION, (session_id, limit)).fetchall()
+    logger.info("conversation_retrieved", session_id=session_id, count=len(rows))
+    # Dict literal por posición: más rápido que dict(sqlite3.Row) o dict(zip(...)) en CPython
+    for r in rows:
+        yield {
             "id": r[0],
             "session_id": r[1],
             "role": r[2],
@@ -236,17 +503,24 @@ def get_conversation(session_id: str, limit: int = 20) -> List[Dict]:
             "confidence": r[6],
             "created_at": r[7],
         }
-        for r in rows
-    ]
-    logger.info("conversation_retrieved", session_id=session_id, count=len(result))
-    return result
+
+
+def get_conversation(session_id: str, limit: int = 20) -> List[Dict]:
+    return list(iter_conversation(session_id, limit))
 
 
 def search_messages(keyword: str, limit: int = 50) -> List[Dict]:
     with _get_conn() as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, session_id, role, message FROM messages WHERE message LIKE ? LIMIT ?", (f"%{keyword}%", limit))
-        rows = c.fetchall()
+        rows = None
+        if len(keyword) >= _FTS_MIN_KEYWORD:
+            try:
+                # Frase FTS5 entre comillas: el trigram la busca como subcadena literal
+                phrase = '"' + keyword.replace('"', '""') + '"'
+                rows = conn.execute(_SQL_SEARCH_MESSAGES_FTS, (phrase, limit)).fetchall()
+            except sqlite3.OperationalError:
+                rows = None
+        if rows is None:
+            rows = conn.execute(_SQL_SEARCH_MESSAGES, (f"%{keyword}%", limit)).fetchall()
     result = [
         {"id": r[0], "session_id": r[1], "role": r[2], "message": r[3]} for r in rows
     ]
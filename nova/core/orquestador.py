@@ -1,4 +1,5 @@
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Iterator, Tuple
 
 from utils.logging import get_logger
 from nova.core.intelligent_router import route as intelligent_route
@@ -6,15 +7,15 @@ from nova.core import llm_router
 from config.settings import settings
 from models import ollama_model
 # from nova.core.cache_system import cache_system  # Commented out to avoid DB issues
+import threading
 import time
 
 logger = get_logger("core.orquestador")
 
+_SPANISH_INSTRUCTION = "IMPORTANTE: Responde ÚNICAMENTE en español neutro de América Latina. NO uses italiano, portugués, inglés u otros idiomas. Si el usuario pregunta en otro idioma, responde en español. "
 
-def route_query(message: str, has_image: bool = False) -> dict:
-    """Delegate routing to intelligent router; keep compatibility shape."""
-    # If LLM brain toggle is active, prefer LLM router (it will fallback to heuristics on timeout)
-    result = llm_router.route_with_llm(message, has_image) if settings.USE_LLM_BRAIN else intelligent_route(message, has_image)
+
+def _normalize_route(result: dict) -> dict:
     # If router asks for clarification, return that shape directly
     if result.get("status") == "needs_clarification":
         return result
@@ -22,13 +23,59 @@ def route_query(message: str, has_image: bool = False) -> dict:
     return {"model": result.get("model"), "confidence": result.get("confidence", 70), "reasoning": result.get("reasoning", "")}
 
 
+# Modelos que se sustituyen localmente antes de generar (Sofía policy: Claude → Mixtral)
+_MODEL_REWRITES: Dict[str, str] = {"claude_code_api": "mixtral:8x7b"}
+
+# Mensajes más largos no se memorizan: la clave retendría el texto completo
+_ROUTE_CACHE_MAX_CHARS = 2000
+
+
+# Marca por hilo: _heuristic_route_items la activa solo cuando realmente ejecuta el router
+_route_miss = threading.local()
+
+
+@lru_cache(maxsize=4096)
+def _heuristic_route_items(message: str, has_image: bool) -> Tuple[Tuple[str, Any], ...]:
+    # El router heurístico es determinista: la decisión normalizada se guarda como tupla inmutable
+    _route_miss.flag = True
+    return tuple(_normalize_route(intelligent_route(message, has_image)).items())
+
+
+def _heuristic_route(message: str, has_image: bool) -> dict:
+    if len(message) > _ROUTE_CACHE_MAX_CHARS:
+        return _normalize_route(intelligent_route(message, has_image))
+    _route_miss.flag = False
+    result = dict(_heuristic_route_items(message, has_image))
+    if not _route_miss.flag:
+        # Hit de caché: intelligent_route no corrió, así que la decisión se registra aquí
+        if result.get("status") == "needs_clarification":
+            logger.info("needs_clarification", message=message[:100], cached=True)
+        else:
+            logger.info("routing_decision", model=result["model"], confidence=result["confidence"], cached=True)
+    return result
+
+
+def route_query(message: str, has_image: bool = False) -> dict:
+    """Delegate routing to intelligent router; keep compatibility shape."""
+    # If LLM brain toggle is active, prefer LLM router (it will fallback to heuristics on timeout)
+    if settings.USE_LLM_BRAIN:
+        return _normalize_route(llm_router.route_with_llm(message, has_image))
+    return _heuristic_route(message, has_image)
+
+
+async def route_query_async(message: str, has_image: bool = False) -> dict:
+    """route_query for the event loop: the LLM router call is awaited instead of blocking a worker thread."""
+    if settings.USE_LLM_BRAIN:
+        return _normalize_route(await llm_router.route_with_llm_async(message, has_image))
+    return _heuristic_route(message, has_image)
+
+
 def generate_response(model: str, prompt: str, history: list | None = None) -> str:
     logger.info("generate_request", model=model)
     history = history or []
 
     # Agregar instrucción de idioma español al prompt
-    spanish_instruction = "IMPORTANTE: Responde ÚNICAMENTE en español neutro de América Latina. NO uses italiano, portugués, inglés u otros idiomas. Si el usuario pregunta en otro idioma, responde en español. "
-    full_prompt = spanish_instruction + prompt
+    full_prompt = _SPANISH_INSTRUCTION + prompt
 
     # Limpiar caché expirado periódicamente (cada 100 requests) - commented out
     # if hasattr(generate_response, '_request_count'):
@@ -55,24 +102,22 @@ def generate_response(model: str, prompt: str, history: list | None = None) -> s
     try:
         # Sofía policy: always route Claude requests to Mixtral locally (fallback)
         original_model = model
-        if model == "claude_code_api":
-            logger.info("claude_local_fallback_to_mixtral", original_model=model)
-            model = "mixtral:8x7b"
+        model = _MODEL_REWRITES.get(model, model)
+        if model != original_model:
+            logger.info("claude_local_fallback_to_mixtral", original_model=original_model)
 
         # Generar respuesta
-        start_time = time.time()
-        generation_start = time.time()
+        # perf_counter: reloj monotónico de alta resolución para medir latencias
+        start_time = time.perf_counter()
         result = ollama_model.generate(model, full_prompt, stream=False, timeout=120)
-        generation_time = time.time() - generation_start
+        generation_time = time.perf_counter() - start_time
 
         # Normalizar resultado
         if isinstance(result, str):
             response_text = result
         elif hasattr(result, "__iter__"):
-            parts = []
-            for chunk in result:
-                parts.append(chunk)
-            response_text = "".join(parts)
+            # str.join consume el iterador directamente, sin lista intermedia
+            response_text = "".join(result)
         else:
             response_text = str(result)
 
@@ -91,7 +136,7 @@ def generate_response(model: str, prompt: str, history: list | None = None) -> s
         #     metadata=metadata
         # )
 
-        total_latency = time.time() - start_time
+        total_latency = time.perf_counter() - start_time
         logger.info("response_generated", model=model,
                    generation_ms=round(generation_time * 1000, 2),
                    total_latency_ms=round(total_latency * 1000, 2))
@@ -102,3 +147,21 @@ def generate_response(model: str, prompt: str, history: list | None = None) -> s
         logger.error("generate_request_failed", error=str(e))
         # No guardar en caché errores
         raise
+
+
+def stream_response(model: str, prompt: str) -> Iterator[str]:
+    """Como generate_response, pero entrega los fragmentos del modelo a medida que Ollama los produce."""
+    logger.info("generate_stream_request", model=model)
+    original_model = model
+    model = _MODEL_REWRITES.get(model, model)
+    if model != original_model:
+        logger.info("claude_local_fallback_to_mixtral", original_model=original_model)
+
+    start_time = time.perf_counter()
+    first_chunk_ms = None
+    for chunk in ollama_model.iter_generate(model, _SPANISH_INSTRUCTION + prompt):
+        if first_chunk_ms is None:
+            first_chunk_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        yield chunk
+    logger.info("response_streamed", model=model, first_chunk_ms=first_chunk_ms,
+               total_latency_ms=round((time.perf_counter() - start_time) * 1000, 2))
@@ -3,91 +3,118 @@
 This analyzer is intentionally lightweight: uses keyword heuristics
 and basic length/intent checks to produce signals for the intelligent router.
 """
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+# Tope de caracteres analizados: cada señal recorre el mensaje completo, así que
+# un texto enorme pegado por el usuario no debe multiplicar el costo del ruteo.
+# De un mensaje más largo se analizan el inicio y el final: en un texto pegado
+# la pregunta real suele ir al final.
+_MAX_ANALYZE_CHARS = 8192
+_ANALYZE_TAIL_CHARS = 2048
+
+# Keywords para detección (tuplas a nivel de módulo: no se reconstruyen en cada llamada)
+_ARCHITECTURE_KEYWORDS = (
+    "arquitect", "microserv", "monolit", "escala", "usuarios",
+    "trade-off", "tradeoffs", "trade offs", "diseño", "diseña"
+)
+
+_CODE_KEYWORDS = (
+    "codigo", "código", "python", "javascript", "script", "programa",
+    "función", "funcion", "debug", "debuggea", "depura", "error",
+    "traceback", "stacktrace", "stack trace", "bug", "git", "bash",
+    "snippet", "implementa", "implementar"
+)
+
+_DEBUG_KEYWORDS = (
+    "error", "exception", "typeerror", "traceback", "stacktrace",
+    "stack trace", "bug", "depura", "debug", "debuggea", "arregla", "fix"
+)
+
+# ✅ ARREGLO CRÍTICO: Detectar "ejemplo" Y "ejemplos"
+_CODE_GENERATION_KEYWORDS = (
+    "funci", "function", "merge", "sort", "algoritm", "algoritmo",
+    "ejemplo", "ejemplos"  # ← AMBAS FORMAS
+)
+
+_CODE_GENERATION_VERBS = (
+    "escribe", "genera", "implementa", "implementar", "dame", "crea",
+    "desarrolla", "programa", "optimiza", "optimizar", "mejora", "mejorar"
+)
+
+_STRATEGY_KEYWORDS = (
+    "estrateg", "estrategia", "detall", "plan", "roadmap", "strategy",
+    "detallada", "detallado"
+)
+
+_COMPLEX_KEYWORDS = (
+    "analiz", "análisis", "analisis", "analiza", "explica", "concepto",
+    "conceptos", "riesg", "evaluar", "evaluación", "evaluacion",
+    "complet", "profund", "resumen", "ejecutiv", "estrateg", "plan", "detall"
+)
+
+_IMAGE_KEYWORDS = ("imagen", "foto", "mira", "describe")
+
+_DOCS_KEYWORDS = (
+    "document", "documenta", "documentación", "documentacion",
+    "tutorial", "guía", "guia", "readme", "manual", "docs"
+)
+
+_QUESTION_PREFIXES = ("qué", "que", "como", "cómo", "cuál", "cual")
+
+
+def _analysis_window(message: str) -> str:
+    """Inicio y final de un mensaje largo; los mensajes de hasta _MAX_ANALYZE_CHARS quedan intactos."""
+    if len(message) <= _MAX_ANALYZE_CHARS:
+        return message
+    # El salto de línea separa ambos tramos: ninguna keyword lo contiene, así que no
+    # aparecen coincidencias nuevas en la unión (y aplicar la ventana dos veces no cambia nada)
+    return message[:_MAX_ANALYZE_CHARS - _ANALYZE_TAIL_CHARS] + "\n" + message[-_ANALYZE_TAIL_CHARS:]
+
+
+def _contains_any(m: str, keywords: Tuple[str, ...]) -> bool:
+    # Bucle explícito con salida temprana: más barato que any() sobre un generador
+    for k in keywords:
+        if k in m:
+            return True
+    return False
 
 
 def analyze(message: str) -> Dict[str, Any]:
     """
     Analiza un mensaje y extrae señales semánticas.
-    
+
     Returns:
         Dict con señales booleanas (has_question, mentions_code, etc.)
     """
+    message = _analysis_window(message)
     m = message.lower().strip()
     tokens = m.split()
-    
-    # Keywords para detección
-    architecture_keywords = [
-        "arquitect", "microserv", "monolit", "escala", "usuarios", 
-        "trade-off", "tradeoffs", "trade offs", "diseño", "diseña"
-    ]
-    
-    code_keywords = [
-        "codigo", "código", "python", "javascript", "script", "programa", 
-        "función", "funcion", "debug", "debuggea", "depura", "error", 
-        "traceback", "stacktrace", "stack trace", "bug", "git", "bash", 
-        "snippet", "implementa", "implementar"
-    ]
-    
-    debug_keywords = [
-        "error", "exception", "typeerror", "traceback", "stacktrace", 
-        "stack trace", "bug", "depura", "debug", "debuggea", "arregla", "fix"
-    ]
-    
-    # ✅ ARREGLO CRÍTICO: Detectar "ejemplo" Y "ejemplos"
-    code_generation_keywords = [
-        "funci", "function", "merge", "sort", "algoritm", "algoritmo", 
-        "ejemplo", "ejemplos"  # ← AMBAS FORMAS
-    ]
-    
-    code_generation_verbs = [
-        "escribe", "genera", "implementa", "implementar", "dame", "crea", 
-        "desarrolla", "programa", "optimiza", "optimizar", "mejora", "mejorar"
-    ]
-    
-    strategy_keywords = [
-        "estrateg", "estrategia", "detall", "plan", "roadmap", "strategy", 
-        "detallada", "detallado"
-    ]
-    
-    complex_keywords = [
-        "analiz", "análisis", "analisis", "analiza", "explica", "concepto", 
-        "conceptos", "riesg", "evaluar", "evaluación", "evaluacion", 
-        "complet", "profund", "resumen", "ejecutiv", "estrateg", "plan", "detall"
-    ]
-    
-    image_keywords = ["imagen", "foto", "mira", "describe"]
-    
-    docs_keywords = [
-        "document", "documenta", "documentación", "documentacion", 
-        "tutorial", "guía", "guia", "readme", "manual", "docs"
-    ]
-    
+
     # Detectar señales básicas primero
-    mentions_code = any(k in m for k in code_keywords)
-    mentions_debug = any(k in m for k in debug_keywords)
-    
+    mentions_code = _contains_any(m, _CODE_KEYWORDS)
+    mentions_debug = _contains_any(m, _DEBUG_KEYWORDS)
+
     # Detectar señales
     signals = {
         "has_question": (
-            "?" in message or 
-            m.startswith(("qué", "que", "como", "cómo", "cuál", "cual"))
+            "?" in message or
+            m.startswith(_QUESTION_PREFIXES)
         ),
         "is_short": len(tokens) <= 2,
-        "mentions_architecture": any(k in m for k in architecture_keywords),
+        "mentions_architecture": _contains_any(m, _ARCHITECTURE_KEYWORDS),
         "mentions_code": mentions_code,
         "mentions_debug": mentions_debug,
-        
+
         # ✅ ARREGLO CRÍTICO: Lógica corregida
         "wants_code_generation": (
-            any(v in m for v in code_generation_verbs) and 
-            (any(k in m for k in code_generation_keywords) or mentions_code)
+            _contains_any(m, _CODE_GENERATION_VERBS) and
+            (mentions_code or _contains_any(m, _CODE_GENERATION_KEYWORDS))
         ),
-        
-        "mentions_strategy": any(k in m for k in strategy_keywords),
-        "mentions_complex": any(k in m for k in complex_keywords),
-        "mentions_image": any(k in m for k in image_keywords),
-        "mentions_docs": any(k in m for k in docs_keywords),
+
+        "mentions_strategy": _contains_any(m, _STRATEGY_KEYWORDS),
+        "mentions_complex": _contains_any(m, _COMPLEX_KEYWORDS),
+        "mentions_image": _contains_any(m, _IMAGE_KEYWORDS),
+        "mentions_docs": _contains_any(m, _DOCS_KEYWORDS),
     }
-    
+
     return signals
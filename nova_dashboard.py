@@ -6,13 +6,13 @@ Muestra lo que NOVA está pensando, diciendo y haciendo
 
 import sys
 import os
+import io
 import time
+from contextlib import redirect_stdout
 import requests
 import json
 from datetime import datetime
 
-from nova.core.cache_system import cache_system
-
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Colores ANSI para terminal
@@ -29,13 +29,14 @@ class Colors:
     UNDERLINE = '\033[4m'
     END = '\033[0m'
 
-def clear_screen():
-    """Limpiar pantalla"""
-    os.system('clear' if os.name == 'posix' else 'cls')
+# Tabla para convertir nombres de modelo en etiquetas legibles en una sola pasada
+_MODEL_LABEL_TRANS = str.maketrans({"_": " ", ":": " "})
 
-def print_logo():
-    """Mostrar logo ASCII de NOVA"""
-    logo = f"""
+# Sesión HTTP persistente: el sondeo cada 5 segundos reutiliza la misma conexión
+_HTTP = requests.Session()
+
+# Logo y pie se formatean una sola vez, no en cada refresco
+_LOGO = f"""
 {Colors.CYAN}{Colors.BOLD}
 ╔══════════════════════════════════════════════════════════════╗
 ║                                                              ║
@@ -50,12 +51,40 @@ def print_logo():
 ║                                                              ║
 ╚══════════════════════════════════════════════════════════════╝
 {Colors.END}"""
-    print(logo)
+
+_FOOTER = (
+    f"\n{Colors.BOLD}{Colors.WHITE}💡 PRESIONA CTRL+C PARA SALIR | ACTUALIZA CADA 5 SEGUNDOS{Colors.END}\n"
+    f"{Colors.CYAN}🔄 NOVA se está auto-optimizando continuamente...{Colors.END}"
+)
+
+# Cursor al inicio + borrar pantalla: una escritura en lugar de lanzar /bin/clear
+_CLEAR = "\x1b[H\x1b[2J"
+
+def clear_screen():
+    """Limpiar pantalla"""
+    if os.name == 'posix':
+        sys.stdout.write(_CLEAR)
+        sys.stdout.flush()
+    else:
+        os.system('cls')
+
+def render_frame():
+    """Construir el cuadro completo en memoria (incluye la consulta al servidor)"""
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        print_logo()
+        show_brain_activity()
+        show_footer()
+    return buf.getvalue()
+
+def print_logo():
+    """Mostrar logo ASCII de NOVA"""
+    print(_LOGO)
 
 def get_status():
     """Obtener estado del sistema"""
     try:
-        response = requests.get("http://localhost:8010/auto-tuning/status", timeout=5)
+        response = _HTTP.get("http://localhost:8010/auto-tuning/status", timeout=5)
         response.raise_for_status()
         return response.json()
     except:
@@ -144,7 +173,7 @@ def show_brain_activity():
     # Mostrar barras de prioridad
     print(f"{Colors.BOLD}Priorities de Modelos:{Colors.END}")
     for model, priority in priorities.items():
-        model_name = model.replace("_", " ").replace(":", " ").title()
+        model_name = model.translate(_MODEL_LABEL_TRANS).title()
         bar = format_priority_bar(priority)
         print(f"  {model_name:<20} {bar}")
 
@@ -179,7 +208,8 @@ def show_brain_activity():
     print(f"  ⭐ Rating promedio: {avg_rating:.2f}")
     print(f"  🔄 Optimizaciones: {len(status['recent_history'])}")
 
-    # Estadísticas del caché
+    # Estadísticas del caché (import diferido: abre la base y arranca el monitor de model_profiles)
+    from nova.core.cache_system import cache_system
     cache_stats = cache_system.get_cache_stats()
     print(f"\n{Colors.BOLD}{Colors.GREEN}🚀 ESTADÍSTICAS DEL CACHÉ:{Colors.END}")
     print("-" * 40)
@@ -193,17 +223,20 @@ def show_brain_activity():
 
 def show_footer():
     """Mostrar footer con instrucciones"""
-    print(f"\n{Colors.BOLD}{Colors.WHITE}💡 PRESIONA CTRL+C PARA SALIR | ACTUALIZA CADA 5 SEGUNDOS{Colors.END}")
-    print(f"{Colors.CYAN}🔄 NOVA se está auto-optimizando continuamente...{Colors.END}")
+    print(_FOOTER)
 
 def main():
     """Función principal"""
     try:
         while True:
-            clear_screen()
-            print_logo()
-            show_brain_activity()
-            show_footer()
+            # El cuadro se arma antes de limpiar y se emite en una sola escritura: sin parpadeo
+            frame = render_frame()
+            if os.name == 'posix':
+                sys.stdout.write(_CLEAR + frame)
+                sys.stdout.flush()
+            else:
+                clear_screen()
+                sys.stdout.write(frame)
 
             # Esperar 5 segundos antes de actualizar
             time.sleep(5)
@@ -8,3 +8,98 @@ def test_status_endpoint():
     assert r.status_code == 200
     d = r.json()
     assert d.get("status") == "operational"
+
+
+def _stream_setup(monkeypatch, tmp_path, chunks, between=None):
+    """Enrutar siempre a mixtral y reemplazar el stream del modelo por `chunks`."""
+    from unittest.mock import AsyncMock
+    from config import settings as cfg
+    from nova.core import orquestador
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+    monkeypatch.setattr(orquestador, "route_query_async",
+                        AsyncMock(return_value={"model": "mixtral:8x7b", "confidence": 90, "reasoning": "test"}))
+    state = {"closed": False}
+
+    def fake_stream(model, prompt):
+        try:
+            for i, chunk in enumerate(chunks):
+                if i and between:
+                    between()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            state["closed"] = True
+
+    monkeypatch.setattr(orquestador, "stream_response", fake_stream)
+    return state
+
+
+def test_chat_stream_persists_full_reply(tmp_path, monkeypatch):
+    from nova.core import memoria
+
+    state = _stream_setup(monkeypatch, tmp_path, ["Ho", "la"])
+    r = TestClient(app).post("/api/chat/stream", json={"message": "hola", "session_id": "st1"})
+    assert r.status_code == 200
+    assert r.text == "Hola"
+    assert r.headers["x-model-used"] == "mixtral:8x7b"
+    assert state["closed"]
+    assert [m["message"] for m in memoria.get_conversation("st1")] == ["Hola", "hola"]
+
+
+def test_chat_stream_error_does_not_persist(tmp_path, monkeypatch):
+    from nova.core import memoria
+
+    _stream_setup(monkeypatch, tmp_path, ["Ho", RuntimeError("model 'x' not found")])
+    client = TestClient(app, raise_server_exceptions=False)
+    try:
+        client.post("/api/chat/stream", json={"message": "hola", "session_id": "st2"})
+    except RuntimeError:
+        pass
+    assert memoria.get_conversation("st2") == []
+
+
+def test_chat_stream_disconnect_closes_stream_and_skips_persist(tmp_path, monkeypatch):
+    import asyncio
+    import json
+    import threading
+    from nova.core import memoria
+
+    release = threading.Event()
+    state = _stream_setup(monkeypatch, tmp_path, [f"p{i} " for i in range(5)], between=lambda: release.wait(5))
+    body = json.dumps({"message": "hola", "session_id": "st3"}).encode()
+    sent = []
+
+    async def run():
+        first_chunk = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # El cliente se va después del primer fragmento
+            await first_chunk.wait()
+            release.set()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                sent.append(message["body"])
+                first_chunk.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/api/chat/stream", "raw_path": b"/api/chat/stream",
+            "root_path": "", "query_string": b"", "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+        await app(scope, receive, send)
+
+    asyncio.run(run())
+    assert sent[0] == b"p0 "
+    assert len(sent) < 5
+    assert state["closed"]
+    assert memoria.get_conversation("st3") == []
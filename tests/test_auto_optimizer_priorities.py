@@ -0,0 +1,35 @@
+import json
+import os
+
+import pytest
+
+from nova.core import auto_optimizer
+
+
+def test_current_priorities_follow_saved_profiles(tmp_path, monkeypatch):
+    from config import settings as cfg
+
+    path = tmp_path / "model_profiles.json"
+    monkeypatch.setattr(cfg.settings, "model_profiles_path", str(path))
+    auto_optimizer._save_model_profiles({"a:7b": {"priority": 50}, "b:8x7b": {"priority": 70}})
+    assert auto_optimizer.get_current_priorities() == {"a:7b": 50, "b:8x7b": 70}
+
+    # Mismo tamaño y mismo mtime que antes: la clave (mtime, tamaño) no cambia
+    st = os.stat(path)
+    profiles = auto_optimizer._load_model_profiles()
+    profiles["a:7b"]["priority"] = 60
+    auto_optimizer._save_model_profiles(profiles)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert os.stat(path).st_size == st.st_size
+    assert auto_optimizer.get_current_priorities() == {"a:7b": 60, "b:8x7b": 70}
+
+
+def test_priorities_read_failure_is_not_memoized(tmp_path):
+    path = tmp_path / "model_profiles.json"
+    path.write_text("", encoding="utf-8")
+    auto_optimizer._priorities_for.cache_clear()
+    # El archivo se lee desde `path`, no desde settings; un archivo truncado falla sin cachearse
+    with pytest.raises(ValueError):
+        auto_optimizer._priorities_for(str(path), 1, 0)
+    path.write_text(json.dumps({"a:7b": {"priority": 40}}), encoding="utf-8")
+    assert auto_optimizer._priorities_for(str(path), 1, 0) == (("a:7b", 40),)
@@ -0,0 +1,74 @@
+from nova.core import memoria, feedback_system
+
+
+def test_record_feedback_bulk(tmp_path, monkeypatch):
+    from config import settings as cfg
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+
+    memoria.init_db()
+    m1 = memoria.save_conversation("s1", "assistant", "uno", "dolphin-mistral:7b")
+    m2 = memoria.save_conversation("s1", "assistant", "dos", "mixtral:8x7b")
+    single = feedback_system.record_feedback(m1, "s1", 4, "bien")
+
+    ids = feedback_system.record_feedback_bulk([(m1, "s1", 5, "muy bien"), (m2, "s1", 2, "lento")])
+    assert ids == [single + 1, single + 2]
+
+    feedback = feedback_system.get_recent_feedback(10)
+    by_id = {f["feedback_id"]: f for f in feedback}
+    assert by_id[ids[1]]["model_used"] == "mixtral:8x7b"
+    assert by_id[ids[1]]["rating"] == 2
+
+
+def test_analyze_performance_cache_sees_new_feedback(tmp_path, monkeypatch):
+    import sqlite3
+    import time
+    from config import settings as cfg
+
+    db_path = str(tmp_path / "nova_memory.db")
+    monkeypatch.setattr(cfg.settings, "db_path", db_path)
+
+    memoria.init_db()
+    m1 = memoria.save_conversation("s1", "assistant", "uno", "dolphin-mistral:7b")
+    feedback_system.record_feedback(m1, "s1", 4, "bien")
+
+    first = feedback_system.analyze_performance(7)
+    assert first["summary"]["total_feedback"] == 1
+    # Sin escrituras la segunda llamada sale de la caché
+    assert feedback_system.analyze_performance(7) is first
+
+    # record_feedback invalida la caché (la conexión compartida no cambia su propio data_version)
+    feedback_system.record_feedback(m1, "s1", 2, "lento")
+    second = feedback_system.analyze_performance(7)
+    assert second["summary"]["total_feedback"] == 2
+
+    # Escritura desde otra conexión (otro proceso): PRAGMA data_version cambia
+    other = sqlite3.connect(db_path)
+    other.execute(
+        "INSERT INTO feedback (message_id, session_id, rating, comment, model_used, created_at_ts) "
+        "VALUES (?, 's1', 5, 'externo', 'dolphin-mistral:7b', ?)",
+        (m1, int(time.time())),
+    )
+    other.commit()
+    other.close()
+    assert feedback_system.analyze_performance(7)["summary"]["total_feedback"] == 3
+
+
+def test_feedback_sql_without_sqlite_335_features(tmp_path, monkeypatch):
+    import time
+    import pytest
+    from config import settings as cfg
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+    memoria.init_db()
+    m1 = memoria.save_conversation("s1", "assistant", "uno", "dolphin-mistral:7b")
+    feedback_system.record_feedback(m1, "s1", 4, "bien")
+    feedback_system.record_feedback(m1, "s1", 1, "malo")
+    with pytest.raises(ValueError):
+        feedback_system.record_feedback(m1 + 100, "s1", 3)
+
+    # La variante sin AS MATERIALIZED (SQLite < 3.35) devuelve las mismas filas
+    legacy_sql = feedback_system._SQL_PERFORMANCE.replace("AS MATERIALIZED (", "AS (")
+    since = int(time.time()) - 7 * 86400
+    with memoria._get_conn() as conn:
+        assert conn.execute(legacy_sql, (since,)).fetchall() == conn.execute(feedback_system._SQL_PERFORMANCE, (since,)).fetchall()
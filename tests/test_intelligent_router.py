@@ -0,0 +1,35 @@
+from config.model_profiles import _DATA as model_profiles
+from nova.core import intelligent_router as ir
+from nova.core.semantic_analyzer import analyze
+
+
+def _reference_scores(signals):
+    # La cascada de reglas con el perfil leído en cada llamada, como antes de la tabla precalculada
+    return {
+        name: ir._score(name, prof.get("priority", 50), frozenset(prof.get("capabilities", [])), signals)
+        for name, prof in model_profiles.items()
+    }
+
+
+def test_score_table_matches_rule_cascade_for_every_mask():
+    assert len(ir._TOP_TABLE) == 1 << len(ir._SIGNAL_BITS)
+    for mask, top in enumerate(ir._TOP_TABLE):
+        signals = {key: True for i, key in enumerate(ir._SIGNAL_BITS) if mask >> i & 1}
+        assert ir._signal_mask(signals) == mask
+        reference = _reference_scores(signals)
+        # Mismo top 3 que sorted(..., reverse=True)[:3] (orden estable ante empates)
+        expected = sorted(reference.items(), key=lambda item: item[1], reverse=True)[:3]
+        assert list(top) == expected, mask
+        for name, score in reference.items():
+            assert ir.score_model_for_query(name, signals) == score
+
+
+def test_score_table_covers_every_signal_the_rules_read():
+    # Una señal de analyze() fuera de _SIGNAL_BITS no debe alterar ningún score;
+    # si una regla nueva la usa, hay que añadirla a _SIGNAL_BITS.
+    extra = [key for key in analyze("hola") if key not in ir._SIGNAL_BITS]
+    for mask in range(1 << len(ir._SIGNAL_BITS)):
+        signals = {key: True for i, key in enumerate(ir._SIGNAL_BITS) if mask >> i & 1}
+        base = _reference_scores(signals)
+        for key in extra:
+            assert _reference_scores({**signals, key: True}) == base, key
@@ -78,3 +78,25 @@ def test_intelligent_router_cases():
     accuracy = hits / total * 100.0
     # ensure at least 87% accuracy
     assert accuracy >= 87.0, f"Accuracy too low: {accuracy}%"
+
+
+def test_cached_route_is_still_logged(monkeypatch):
+    from structlog.testing import capture_logs
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "USE_LLM_BRAIN", False)
+    orquestador._heuristic_route_items.cache_clear()
+    msg = "Escribe una función en Python para merge sort"
+
+    with capture_logs() as first:
+        decision = orquestador.route_query(msg)
+    with capture_logs() as second:
+        assert orquestador.route_query(msg) == decision
+
+    assert [e for e in first if e["event"] == "routing_decision" and e.get("cached")] == []
+    assert [(e["event"], e["model"], e["cached"]) for e in second] == [("routing_decision", decision["model"], True)]
+
+    with capture_logs() as vague:
+        orquestador.route_query("ayuda")
+        orquestador.route_query("ayuda")
+    assert [e for e in vague if e["event"] == "needs_clarification"][-1]["cached"] is True
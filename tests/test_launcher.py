@@ -38,7 +38,7 @@ def test_launcher_port_occupation_handling(monkeypatch):
     class R:
         status_code = 200
 
-    monkeypatch.setattr(launcher, "requests", type("Req", (), {"get": lambda *a, **k: R()}))
+    monkeypatch.setattr(launcher, "_SESSION", type("Req", (), {"get": lambda *a, **k: R()}))
 
     # Run start (should pick 8001)
     launcher.start()
@@ -65,7 +65,7 @@ def test_launcher_model_auto_download(monkeypatch):
     class R:
         status_code = 200
 
-    monkeypatch.setattr(launcher, "requests", type("Req", (), {"get": lambda *a, **k: R()}))
+    monkeypatch.setattr(launcher, "_SESSION", type("Req", (), {"get": lambda *a, **k: R()}))
 
     launcher.start()
 
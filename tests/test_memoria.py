@@ -16,3 +16,220 @@ def test_memoria_init_and_save(tmp_path):
     memoria.save_conversation("s1", "assistant", "respuesta", "dolphin-mistral:7b", "reason")
     conv = memoria.get_conversation("s1")
     assert len(conv) >= 2
+
+
+def test_concurrent_saves_get_their_own_ids(tmp_path, monkeypatch):
+    import threading
+    from config import settings as cfg
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+    memoria.init_db()
+
+    saved = {}
+
+    def writer(n):
+        for i in range(20):
+            text = f"w{n}-{i}"
+            saved[memoria.save_conversation(f"s{n}", "user", text)] = text
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(saved) == 160
+    for n in range(8):
+        for row in memoria.get_conversation(f"s{n}", limit=50):
+            assert saved[row["id"]] == row["message"]
+
+
+def test_save_conversations_batch(tmp_path, monkeypatch):
+    from config import settings as cfg
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+    memoria.init_db()
+
+    first = memoria.save_conversation("s1", "user", "hola")
+    ids = memoria.save_conversations(
+        [("s1", "assistant", "uno", "dolphin-mistral:7b", None, 80), ("s1", "user", "dos", None, None, None)]
+    )
+    assert ids == [first + 1, first + 2]
+    assert [m["message"] for m in memoria.get_conversation("s1")] == ["dos", "uno", "hola"]
+
+
+# Esquema tal como lo dejaba init_db antes de user_version (versión 0)
+_BASELINE_SCHEMA = """
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    message TEXT NOT NULL,
+    model_used TEXT,
+    reasoning TEXT,
+    confidence INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id INTEGER,
+    session_id TEXT,
+    rating INTEGER NOT NULL,
+    comment TEXT,
+    model_used TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(message_id) REFERENCES messages(id)
+);
+CREATE TABLE response_cache (
+    cache_key TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    response TEXT NOT NULL,
+    metadata TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP,
+    hit_count INTEGER DEFAULT 0,
+    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE optimization_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_name TEXT NOT NULL,
+    old_priority INTEGER NOT NULL,
+    new_priority INTEGER NOT NULL,
+    change_amount INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    avg_rating REAL,
+    total_feedback INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_messages_session ON messages(session_id);
+CREATE INDEX idx_messages_created ON messages(created_at);
+CREATE INDEX idx_feedback_message ON feedback(message_id);
+CREATE INDEX idx_feedback_created ON feedback(created_at);
+CREATE INDEX idx_response_cache_expires_at ON response_cache(expires_at);
+CREATE INDEX idx_response_cache_model ON response_cache(model_name);
+CREATE INDEX idx_response_cache_query_model ON response_cache(query, model_name);
+"""
+
+
+def test_init_db_upgrades_baseline_schema(tmp_path, monkeypatch):
+    import hashlib
+    import json
+    import sqlite3
+    import time
+    from datetime import datetime, timedelta
+    from structlog.testing import capture_logs
+    from config import settings as cfg
+    from nova.core import feedback_system
+    from nova.core.cache_system import cache_system
+
+    db_path = str(tmp_path / "nova_memory.db")
+    raw = sqlite3.connect(db_path)
+    raw.executescript(_BASELINE_SCHEMA)
+    raw.executemany(
+        "INSERT INTO messages (session_id, role, message, model_used) VALUES (?, ?, ?, ?)",
+        [
+            ("old", "user", "Hubo un ERROR de conexión", None),
+            ("old", "assistant", "Revisa el puerto", "dolphin-mistral:7b"),
+            ("old", "assistant", "Otra respuesta", "mixtral:8x7b"),
+        ],
+    )
+    # record_feedback guardaba datetime.now() (texto con microsegundos) en created_at
+    now = datetime.now()
+    raw.executemany(
+        "INSERT INTO feedback (message_id, session_id, rating, comment, model_used, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (2, "old", 5, "bien", "dolphin-mistral:7b", str(now - timedelta(days=1))),
+            (3, "old", 2, "lento", "mixtral:8x7b", str(now - timedelta(days=2))),
+            (3, "old", 1, "malo", "mixtral:8x7b", str(now - timedelta(days=30))),
+        ],
+    )
+    # Clave de caché con la derivación original (json.dumps con sort_keys)
+    old_key = hashlib.sha256(json.dumps(
+        {"query": "hola", "model": "mixtral:8x7b", "params": {"temperature": 0.7}}, sort_keys=True
+    ).encode()).hexdigest()
+    raw.execute(
+        "INSERT INTO response_cache (cache_key, query, model_name, response, metadata, created_at, expires_at, hit_count, last_accessed) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+        (old_key, "hola", "mixtral:8x7b", json.dumps({"text": "respuesta"}), "{}", time.time(), time.time() + 3600, time.time()),
+    )
+    raw.commit()
+    raw.close()
+
+    monkeypatch.setattr(cfg.settings, "db_path", db_path)
+    memoria.init_db()
+
+    conn = memoria._connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == memoria._SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM feedback WHERE created_at_ts IS NULL").fetchone()[0] == 0
+    cache_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'response_cache'").fetchone()[0]
+    assert "WITHOUT ROWID" in cache_sql.upper()
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_response_cache_query_model'").fetchone() is None
+
+    # Filas anteriores a la migración: indexadas en FTS y visibles a la búsqueda
+    assert [m["id"] for m in memoria.search_messages("error de")] == [1]
+
+    # La ventana de 7 días deja fuera el feedback de hace 30 días
+    perf = feedback_system.analyze_performance(7)
+    assert perf["summary"]["total_feedback"] == 2
+    assert perf["model_performance"]["mixtral:8x7b"]["total_feedback"] == 1
+    assert perf["model_performance"]["mixtral:8x7b"]["min_rating"] == 2
+
+    cached = cache_system.get_cached_response("Hola ", "mixtral:8x7b", temperature=0.7)
+    assert cached is not None and cached["cache_key"] == old_key
+    assert cached["response"] == {"text": "respuesta"}
+
+    # Segunda llamada (p.ej. otro proceso): user_version ya está al día y no se migra nada
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    monkeypatch.setattr(memoria, "_initialized_path", None)
+    with capture_logs() as logs:
+        memoria.init_db()
+    events = [entry["event"] for entry in logs]
+    assert "db_schema_current" in events and "db_initialized" not in events
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+
+
+def _search_db(tmp_path, monkeypatch, messages):
+    from config import settings as cfg
+
+    monkeypatch.setattr(cfg.settings, "db_path", str(tmp_path / "nova_memory.db"))
+    memoria.init_db()
+    return memoria.save_conversations([("s1", "user", m, None, None, None) for m in messages])
+
+
+def test_search_messages_substring_ignores_case(tmp_path, monkeypatch):
+    ids = _search_db(tmp_path, monkeypatch, ["Configurar el SERVIDOR web", "nada que ver", "servidores caídos"])
+    assert [m["id"] for m in memoria.search_messages("servidor")] == [ids[0], ids[2]]
+    # Subcadena en mitad de palabra, igual que LIKE '%kw%'
+    assert [m["id"] for m in memoria.search_messages("RVID")] == [ids[0], ids[2]]
+    assert [m["id"] for m in memoria.search_messages("servidor", limit=1)] == [ids[0]]
+
+
+def test_search_messages_keyword_with_quotes_and_operators(tmp_path, monkeypatch):
+    ids = _search_db(tmp_path, monkeypatch, [
+        'dijo "hola mundo" y se fue', "perros OR gatos", "usa a*b en la fórmula", "perros y gatos",
+    ])
+    assert [m["id"] for m in memoria.search_messages('"hola mundo"')] == [ids[0]]
+    assert [m["id"] for m in memoria.search_messages("perros OR gatos")] == [ids[1]]
+    assert [m["id"] for m in memoria.search_messages("a*b")] == [ids[2]]
+    assert memoria.search_messages("NEAR(") == []
+
+
+def test_search_messages_short_keyword_uses_like(tmp_path, monkeypatch):
+    ids = _search_db(tmp_path, monkeypatch, ["Python 3.12", "sin versión", "ok"])
+    assert [m["id"] for m in memoria.search_messages("3.")] == [ids[0]]
+    assert [m["id"] for m in memoria.search_messages("OK")] == [ids[2]]
+    assert [m["id"] for m in memoria.search_messages("n")] == [ids[0], ids[1]]
+
+
+def test_search_messages_follows_updates_and_deletes(tmp_path, monkeypatch):
+    ids = _search_db(tmp_path, monkeypatch, ["mensaje original", "otro mensaje original"])
+    with memoria._get_conn() as conn:
+        conn.execute("UPDATE messages SET message = ? WHERE id = ?", ("texto corregido", ids[0]))
+        conn.execute("DELETE FROM messages WHERE id = ?", (ids[1],))
+        conn.commit()
+    assert memoria.search_messages("original") == []
+    assert [m["message"] for m in memoria.search_messages("corregido")] == ["texto corregido"]
+    # integrity-check compara el índice con la tabla messages y falla si los triggers lo desfasaron
+    with memoria._get_conn() as conn:
+        conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('integrity-check')")
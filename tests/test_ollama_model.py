@@ -0,0 +1,59 @@
+import orjson
+import pytest
+
+from models import ollama_model
+
+
+class _FakeStream:
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+def _fake_post(monkeypatch, objs):
+    stream = _FakeStream([orjson.dumps(o) if o is not None else b"" for o in objs])
+    calls = []
+
+    def post(url, json=None, **kwargs):
+        calls.append(json)
+        return stream
+
+    monkeypatch.setattr(ollama_model._SESSION, "post", post)
+    return stream, calls
+
+
+def test_iter_generate_yields_chunks_until_done(monkeypatch):
+    stream, calls = _fake_post(monkeypatch, [
+        {"response": "Ho", "done": False},
+        None,
+        {"response": "la", "done": False},
+        {"response": "", "done": True},
+        {"response": "ignorado", "done": False},
+    ])
+    assert list(ollama_model.iter_generate("mixtral:8x7b", "hola")) == ["Ho", "la"]
+    assert calls[0]["stream"] is True
+    assert stream.closed
+
+
+def test_iter_generate_raises_on_error_line(monkeypatch):
+    stream, _ = _fake_post(monkeypatch, [
+        {"response": "Ho", "done": False},
+        {"error": "model 'x' not found"},
+    ])
+    chunks = ollama_model.iter_generate("x", "hola")
+    assert next(chunks) == "Ho"
+    with pytest.raises(RuntimeError, match="not found"):
+        next(chunks)
+    assert stream.closed
@@ -0,0 +1,27 @@
+from nova.core import semantic_analyzer
+from nova.core.intelligent_router import route
+
+# Relleno sin ninguna keyword: solo alarga el mensaje
+_FILLER = "lorem ipsum dolor sit amet " * 800
+
+
+def test_long_message_keeps_trailing_question():
+    question = "como arreglo este error de python?"
+    long_message = _FILLER + question
+    assert len(long_message) > semantic_analyzer._MAX_ANALYZE_CHARS
+
+    signals = semantic_analyzer.analyze(long_message)
+    assert signals["has_question"]
+    assert signals["mentions_code"] and signals["mentions_debug"]
+    assert route(long_message)["model"] == route(question)["model"]
+
+
+def test_long_message_ignores_middle_and_window_is_stable():
+    long_message = "hola " + _FILLER + "arquitectura de microservicios " + _FILLER + "gracias"
+    signals = semantic_analyzer.analyze(long_message)
+    # Solo cuentan el inicio y el final del texto
+    assert not signals["mentions_architecture"]
+
+    window = semantic_analyzer._analysis_window(long_message)
+    assert semantic_analyzer._analysis_window(window) == window
+    assert semantic_analyzer._analysis_window("mensaje corto") == "mensaje corto"